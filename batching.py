@@ -0,0 +1,71 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls of a batch function into fewer, larger calls.
+
+    `function` maps a list of items to a list of results of the same length.
+    Callers submit their items from any thread; one background thread takes
+    everything queued (up to `max_batch_size` items, waiting at most
+    `max_wait` seconds for more) and runs it as one call. With `max_wait` of
+    0 no latency is added: items that arrive while a batch runs form the next.
+    """
+
+    def __init__(self, function, max_batch_size=64, max_wait=0.0):
+        self.function = function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = queue.SimpleQueue()
+        self.batches = 0
+        self.items = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, items):
+        """Results of `function` for `items`, computed as part of a shared batch."""
+        if not items:
+            return []
+        future = Future()
+        self._pending.put((list(items), future))
+        return future.result()
+
+    def _take_batch(self):
+        batch = [self._pending.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                entry = self._pending.get(timeout=timeout) if timeout > 0 else self._pending.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(entry)
+            size += len(entry[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            items = [item for entry_items, _ in batch for item in entry_items]
+            try:
+                results = self.function(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            offset = 0
+            for entry_items, future in batch:
+                future.set_result(results[offset:offset + len(entry_items)])
+                offset += len(entry_items)
+
+    def stats(self):
+        """Batches run and items processed so far, as a dict."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
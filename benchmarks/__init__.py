@@ -0,0 +1,2 @@
+"""Benchmarks for the Telecom AI Assistant. Run from the repository root,
+e.g. `python -m benchmarks.index_recall`."""
@@ -0,0 +1,131 @@
+"""
+Chunks, bytes and top-k slots saved by the ingestion chunk filter.
+
+Chunks every processed file twice into throwaway stores, with and without
+`chunk_filter.ChunkFilter`, and compares them:
+  * chunks and chunk text bytes,
+  * flat index bytes (one float32 vector of --dim per chunk, plus its id)
+    and flat search time over that many random unit vectors,
+  * the share of lexical top-k slots taken by chunks the filter drops, for
+    the labelled in-scope queries and the corpus section headings.
+
+    python -m benchmarks.chunk_filter --k 4
+"""
+import os
+import json
+import time
+import tempfile
+import argparse
+import faiss
+import numpy as np
+from benchmarks.query_gate import load_labelled_queries
+from benchmarks.retrieval_modes import heading_queries
+from chunk_filter import REASONS, ChunkFilter
+from chunk_store import DATA_FILE, ChunkStore, ChunkStoreWriter
+from chunking import PROCESSED_DATA_DIR, iter_chunk_spans, iter_text_file
+from lexical_index import LexicalIndex, build_lexical_index
+from manifest import hash_text, make_chunk_ids
+
+def build_stores(directory, filtered_dir):
+    """Chunk the processed corpus into an unfiltered and a filtered store."""
+    stats = dict.fromkeys(["kept", *REASONS, "bytes"], 0)
+    dropped_ids = set()
+    files = sorted(file for file in os.listdir(PROCESSED_DATA_DIR) if file.endswith(".txt"))
+    with ChunkStoreWriter(directory) as everything, ChunkStoreWriter(filtered_dir) as filtered:
+        for file in files:
+            spans = list(iter_chunk_spans(iter_text_file(os.path.join(PROCESSED_DATA_DIR, file))))
+            ids = make_chunk_ids(file, [hash_text(chunk) for _, chunk in spans])
+            chunk_filter = ChunkFilter(enabled=True)
+            for chunk_id, (start, chunk) in zip(ids, spans):
+                everything.add(chunk_id, chunk, file, start, start + len(chunk))
+                if chunk_filter.check(chunk):
+                    dropped_ids.add(chunk_id)
+                else:
+                    filtered.add(chunk_id, chunk, file, start, start + len(chunk))
+            for key, value in chunk_filter.stats().items():
+                stats[key] += value
+    return stats, dropped_ids
+
+def flat_search_us(num_vectors, dim, num_queries=2000, k=4, repeats=30):
+    """
+    Per-query time (µs) of an exact inner-product search over random unit
+    vectors. Queries are searched as one batch: single searches of a corpus
+    this small are dominated by call overhead, not by the vectors scanned.
+    """
+    # One thread, so the comparison is not at the mercy of the scheduler
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    queries = rng.standard_normal((num_queries, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    faiss.normalize_L2(queries)
+    index = faiss.IndexFlatIP(dim)
+    index.add(vectors)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        index.search(queries, k)
+        best = min(best, time.perf_counter() - start)
+    return best / num_queries * 1e6
+
+def describe(directory, queries, k, dim, dropped_ids):
+    store = ChunkStore(directory)
+    build_lexical_index(store, directory)
+    lexical = LexicalIndex(directory)
+    slots = junk = 0
+    for query in queries:
+        hits = lexical.search(query, k)
+        slots += len(hits)
+        junk += sum(chunk_id in dropped_ids for chunk_id, _ in hits)
+    row = {
+        "chunks": len(store),
+        "text_kb": round(os.path.getsize(os.path.join(directory, DATA_FILE)) / 1024, 1),
+        "index_kb": round(len(store) * dim * 4 / 1024 + len(json.dumps(store.ids)) / 1024, 1),
+        "search_us": round(flat_search_us(len(store), dim, k=k), 2),
+        "junk_topk_pct": round(100 * junk / slots, 1) if slots else 0.0,
+    }
+    store.close()
+    return row
+
+def run_benchmark(k, dim, headings):
+    queries = [query for query, telecom in load_labelled_queries() if telecom]
+    queries += heading_queries(headings)
+    with tempfile.TemporaryDirectory() as tmp:
+        unfiltered_dir = os.path.join(tmp, "unfiltered")
+        filtered_dir = os.path.join(tmp, "filtered")
+        stats, dropped_ids = build_stores(unfiltered_dir, filtered_dir)
+        rows = [
+            {"store": name, **describe(directory, queries, k, dim, dropped_ids)}
+            for name, directory in (("unfiltered", unfiltered_dir), ("filtered", filtered_dir))
+        ]
+    return {"k": k, "dim": dim, "queries": len(queries), "dropped": stats, "stores": rows}
+
+def print_table(result):
+    header = f"{'store':<11} {'chunks':>7} {'text KB':>8} {'index KB':>9} {'search µs':>10} {'junk top-k %':>13}"
+    print(header)
+    print("-" * len(header))
+    for row in result["stores"]:
+        print(
+            f"{row['store']:<11} {row['chunks']:>7} {row['text_kb']:>8} {row['index_kb']:>9} "
+            f"{row['search_us']:>10} {row['junk_topk_pct']:>13}"
+        )
+    dropped = result["dropped"]
+    print(
+        f"\nDropped: {', '.join(f'{dropped[reason]} {reason}' for reason in REASONS)} "
+        f"({dropped['bytes'] / 1024:.1f} KB of text)"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2: 384).")
+    parser.add_argument("--headings", type=int, default=50, help="Section headings to add as queries.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.k, args.dim, args.headings)
+    print_table(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
@@ -0,0 +1,78 @@
+"""
+Concurrency check for the shared QA chains in `generate_response`.
+
+Fires many simultaneous requests with random k and doc_type against the
+echo chat model from `benchmarks.stubs`, which answers with its prompt. Each
+answer must equal the doc_type's prompt filled with exactly the top-k
+chunks for that query, so a request that picked up another request's k or
+template is reported. Exits non-zero on any mismatch.
+
+    python -m benchmarks.concurrent_chains --requests 500 --threads 32
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stubs import install_stubs
+
+QUERIES = [
+    "How do I fix packet loss on a fiber link?",
+    "Grounding requirements for the telecom room network equipment",
+    "What causes signal drop near a cell tower?",
+    "Battery backup sizing for a UPS at the site",
+    "Cabling standards for wireless access points",
+    "Alarm handling for a DC rectifier fault",
+]
+DOC_TYPES = ["report", "sop", "summary", "default", "SOP", "unknown"]
+
+def expected_answer(query, doc_type, k):
+    """The prompt the chain must send for this request, computed single-threaded."""
+    from context_builder import build_context
+    from generate_response import get_prompt
+    from retrieval import embed_query, search
+    documents = [doc for doc, _ in search(embed_query(query), k)]
+    context = "\n\n".join(doc.page_content for doc in build_context(documents, doc_type).documents)
+    return get_prompt(doc_type).format(context=context, question=query)
+
+def run_check(num_requests, threads, max_k, seed=0):
+    from generate_response import generate_response
+    rng = random.Random(seed)
+    requests = [
+        (rng.choice(QUERIES), rng.choice(DOC_TYPES), rng.randint(1, max_k))
+        for _ in range(num_requests)
+    ]
+    expected = {request: expected_answer(*request) for request in set(requests)}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        answers = list(pool.map(lambda request: generate_response(*request)[0], requests))
+    elapsed = time.perf_counter() - start
+
+    mismatches = [
+        {"query": query, "doc_type": doc_type, "k": k}
+        for (query, doc_type, k), answer in zip(requests, answers)
+        if answer != expected[(query, doc_type, k)]
+    ]
+    return {
+        "requests": num_requests,
+        "threads": threads,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(num_requests / elapsed, 1),
+        "mismatches": len(mismatches),
+        "first_mismatches": mismatches[:5],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--max-k", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.01, help="Seconds the stub LLM takes per call.")
+    args = parser.parse_args()
+
+    install_stubs(llm_latency=args.llm_latency)
+    result = run_check(args.requests, args.threads, args.max_k)
+    print(json.dumps(result, indent=4))
+    sys.exit(1 if result["mismatches"] else 0)
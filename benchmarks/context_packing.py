@@ -0,0 +1,72 @@
+"""
+Prompt tokens saved by `context_builder.build_context`.
+
+Retrieves the top-k chunks for the labelled in-scope queries and the
+corpus section headings, packs them for each doc_type, and reports the
+estimated context tokens before and after packing (merged overlaps,
+stripped dot leaders, dropped near-duplicates, budget).
+
+    python -m benchmarks.context_packing --k 2 4 8
+    python -m benchmarks.context_packing --mode lexical   # no embedding model
+"""
+import json
+import logging
+import argparse
+from benchmarks.query_gate import load_labelled_queries
+from benchmarks.retrieval_modes import heading_queries
+from context_builder import CONTEXT_TOKEN_BUDGETS, build_context
+from retrieval import RETRIEVAL_MODES, search_queries
+
+def benchmark_packing(queries, ks, mode):
+    rows = []
+    for k in ks:
+        hits = search_queries(queries, k, mode=mode)
+        for doc_type in CONTEXT_TOKEN_BUDGETS:
+            before = after = chunks = passages = 0
+            for query_hits in hits:
+                documents = [doc for doc, _ in query_hits]
+                context = build_context(documents, doc_type)
+                before += context.tokens_before
+                after += context.tokens_after
+                chunks += len(documents)
+                passages += len(context.documents)
+            rows.append({
+                "k": k,
+                "doc_type": doc_type,
+                "queries": len(queries),
+                "chunks": chunks,
+                "passages": passages,
+                "tokens_before": before,
+                "tokens_after": after,
+                "saved_pct": round(100 * (1 - after / before), 1) if before else 0.0,
+            })
+    return rows
+
+def print_table(rows):
+    header = f"{'k':>3} {'doc_type':<8} {'chunks':>7} {'passages':>9} {'tokens in':>10} {'tokens out':>11} {'saved %':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['k']:>3} {row['doc_type']:<8} {row['chunks']:>7} {row['passages']:>9} "
+            f"{row['tokens_before']:>10} {row['tokens_after']:>11} {row['saved_pct']:>8}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--mode", choices=RETRIEVAL_MODES, default="dense")
+    parser.add_argument("--headings", type=int, default=50, help="Section headings to add as queries.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    # Per-request context logging would drown the table
+    logging.getLogger().setLevel(logging.WARNING)
+    queries = [query for query, telecom in load_labelled_queries() if telecom]
+    queries += heading_queries(args.headings)
+    results = benchmark_packing(queries, args.k, args.mode)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
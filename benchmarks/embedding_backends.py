@@ -0,0 +1,170 @@
+"""
+Embedding backends compared: startup, query latency, throughput and parity.
+
+For each backend in --backends (see EMBEDDING_BACKEND in `resources`):
+  * startup: a fresh Python process importing it, loading the model and
+    encoding one query (seconds, and the process's peak RSS);
+  * query latency: p50/p99 ms of one `embed_query` call, the serving path;
+  * throughput: chunks/s of `embed_documents` over --documents chunks;
+  * parity with the --reference backend (torch by default): cosine of each
+    text's two vectors, and recall@k of the reference's top-k chunks when
+    only the queries are encoded by the backend (index left as built) and
+    when chunks are re-encoded too.
+
+Chunks come from the chunk store in data/chunks when there is one, else
+from the synthetic benchmark corpus. Backends that cannot load (missing
+package or exported model) are reported instead of measured.
+
+    python onnx_embeddings.py   # export the ONNX models first
+    python -m benchmarks.embedding_backends --backends torch onnx onnx-int8
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+import numpy as np
+import resources
+from benchmarks.concurrent_chains import QUERIES
+from benchmarks.suite import corpus_sentences, retrieval_queries
+
+STARTUP_SCRIPT = """
+import json, time, resource
+start = time.perf_counter()
+import resources
+resources.set_embedding_backend({backend!r})
+resources.get_embedding_model().embed_query("warm up")
+print(json.dumps({{
+    "startup_s": round(time.perf_counter() - start, 3),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}}))
+"""
+
+def startup(backend):
+    """Cold start of `backend` in a new process, or the error it failed with."""
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT.format(backend=backend)], capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def load_texts(documents, queries):
+    """Up to `documents` chunk texts and `queries` queries."""
+    from chunk_store import ChunkStore, store_exists
+    sentences = corpus_sentences()
+    if store_exists():
+        store = ChunkStore()
+        step = max(1, len(store) // documents)
+        chunk_texts = [chunk.text for chunk in store.get_many(store.ids[::step][:documents])]
+        store.close()
+    else:
+        chunk_texts = [" ".join(sentences[i:i + 8]) for i in range(0, 8 * documents, 8)]
+    query_texts = (QUERIES + retrieval_queries(sentences, queries))[:queries]
+    return chunk_texts, query_texts
+
+def top_k(query_vectors, document_vectors, k):
+    return np.argsort(-(query_vectors @ document_vectors.T), axis=1)[:, :k]
+
+def recall_at_k(found, expected):
+    """Fraction of the expected top-k found, averaged over queries."""
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]))
+
+def measure(model, chunk_texts, query_texts):
+    """Vectors of the texts, with query latency and document throughput."""
+    model.embed_query("warm up")
+    latencies = []
+    query_vectors = []
+    for query in query_texts:
+        start = time.perf_counter()
+        query_vectors.append(model.embed_query(query))
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    document_vectors = model.embed_documents(chunk_texts)
+    elapsed = time.perf_counter() - start
+    return {
+        "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "query_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "chunks_per_s": round(len(chunk_texts) / elapsed, 1),
+    }, np.array(query_vectors, dtype=np.float32), np.array(document_vectors, dtype=np.float32)
+
+def parity(vectors, reference, k):
+    queries, documents = vectors
+    reference_queries, reference_documents = reference
+    cosines = np.concatenate([
+        (queries * reference_queries).sum(axis=1), (documents * reference_documents).sum(axis=1)
+    ])
+    expected = top_k(reference_queries, reference_documents, k)
+    return {
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        f"recall@{k}_queries_only": round(recall_at_k(top_k(queries, reference_documents, k), expected), 4),
+        f"recall@{k}_reindexed": round(recall_at_k(top_k(queries, documents, k), expected), 4),
+    }
+
+def run_benchmark(backends, reference, documents, queries, k):
+    chunk_texts, query_texts = load_texts(documents, queries)
+    rows = []
+    vectors = {}
+    for backend in dict.fromkeys([reference] + backends):
+        row = {"backend": backend, **startup(backend)}
+        if "error" not in row:
+            resources.set_embedding_backend(backend)
+            timings, query_vectors, document_vectors = measure(
+                resources.get_embedding_model(), chunk_texts, query_texts
+            )
+            row.update(timings)
+            vectors[backend] = (query_vectors, document_vectors)
+        if backend in backends:
+            rows.append(row)
+    rows.sort(key=lambda row: backends.index(row["backend"]))
+    for row in rows:
+        if row["backend"] in vectors and reference in vectors and row["backend"] != reference:
+            row.update(parity(vectors[row["backend"]], vectors[reference], k))
+    return {
+        "reference": reference, "documents": len(chunk_texts), "queries": len(query_texts), "k": k,
+        "reference_available": reference in vectors, "backends": rows,
+    }
+
+def print_table(result):
+    print(
+        f"{result['documents']} chunks, {result['queries']} queries, k={result['k']}, "
+        f"parity against {result['reference']}"
+        + ("" if result["reference_available"] else " (unavailable, parity skipped)") + "\n"
+    )
+    recall = [f"recall@{result['k']}_queries_only", f"recall@{result['k']}_reindexed"]
+    header = (
+        f"{'backend':<10} {'startup s':>9} {'rss MB':>7} {'p50 ms':>7} {'p99 ms':>7} {'chunks/s':>9} "
+        f"{'cos mean':>9} {'cos min':>8} {'recall q':>9} {'recall re':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in result["backends"]:
+        if "error" in row:
+            print(f"{row['backend']:<10} unavailable: {row['error']}")
+            continue
+        print(
+            f"{row['backend']:<10} {row['startup_s']:>9} {row['peak_rss_mb']:>7} {row['query_p50_ms']:>7} "
+            f"{row['query_p99_ms']:>7} {row['chunks_per_s']:>9} {row.get('cosine_mean', ''):>9} "
+            f"{row.get('cosine_min', ''):>8} {row.get(recall[0], ''):>9} {row.get(recall[1], ''):>10}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=resources.EMBEDDING_BACKENDS, default=list(resources.EMBEDDING_BACKENDS))
+    parser.add_argument("--reference", choices=resources.EMBEDDING_BACKENDS, default="torch")
+    parser.add_argument("--documents", type=int, default=500, help="Chunks to encode.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run_benchmark(args.backends, args.reference, args.documents, args.queries, args.k)
+    print_table(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
@@ -0,0 +1,126 @@
+"""
+Recall@k and query latency of flat, IVF and HNSW indexes.
+
+Every index type is built with `embedding_generation.create_faiss_index`, so
+the numbers describe exactly what `process_embeddings --index-type` builds.
+Recall is measured against the exact flat index; latency is per single-query
+search, as issued by `retrieve_relevant_documents`.
+
+    python -m benchmarks.index_recall --sizes 1000 10000 100000
+    python -m benchmarks.index_recall --from-index   # current vectorstore vectors
+"""
+import json
+import time
+import argparse
+import faiss
+import numpy as np
+from embedding_generation import INDEX_TYPES, create_faiss_index
+from retrieval import search_params
+
+DIM = 384  # all-MiniLM-L6-v2
+
+def synthetic_corpus(size, dim=DIM, seed=0):
+    """Unit vectors drawn around random topic centres, like real chunk embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(8, int(np.sqrt(size))), dim)).astype(np.float32)
+    vectors = centres[rng.integers(len(centres), size=size)]
+    vectors += 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def make_queries(corpus, num_queries, seed=1):
+    """Perturbed corpus vectors, so every query has close neighbours."""
+    rng = np.random.default_rng(seed)
+    queries = corpus[rng.integers(len(corpus), size=num_queries)].copy()
+    queries += 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+def measure(index, queries, k, params=None):
+    """Run queries one at a time; return result ids and per-query latencies (ms)."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids[i:i + 1] = index.search(queries[i:i + 1], k, params=params)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+def recall_at_k(ids, truth):
+    """Fraction of the exact top-k found, averaged over queries."""
+    k = truth.shape[1]
+    return float(np.mean([len(set(row) & set(exact)) / k for row, exact in zip(ids, truth)]))
+
+def benchmark_corpus(corpus, queries, k, nprobes, ef_searches):
+    """Build every index type over `corpus` and measure it at each search setting."""
+    rows = []
+    truth = None
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index, params = create_faiss_index(corpus, index_type)
+        index.add(corpus)
+        build_seconds = time.perf_counter() - start
+
+        if index_type == "ivf":
+            settings = [("nprobe", n) for n in nprobes if n <= params["nlist"]]
+        elif index_type == "hnsw":
+            settings = [("ef_search", ef) for ef in ef_searches]
+        else:
+            settings = [(None, None)]
+
+        for knob, value in settings:
+            search_kwargs = {knob: value} if knob else {}
+            ids, latencies = measure(index, queries, k, search_params(index, **search_kwargs))
+            if truth is None:
+                truth = ids  # flat is first and exact
+            rows.append({
+                "corpus_size": len(corpus),
+                "index_type": index_type,
+                "knob": knob,
+                "value": value,
+                "build_seconds": round(build_seconds, 3),
+                f"recall@{k}": round(recall_at_k(ids, truth), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+            })
+    return rows
+
+def print_table(rows, k):
+    header = f"{'size':>8} {'index':<6} {'setting':<14} {'build s':>8} {f'recall@{k}':>9} {'p50 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        setting = f"{row['knob']}={row['value']}" if row["knob"] else "exact"
+        print(
+            f"{row['corpus_size']:>8} {row['index_type']:<6} {setting:<14} {row['build_seconds']:>8} "
+            f"{row[f'recall@{k}']:>9} {row['p50_ms']:>8} {row['p99_ms']:>8}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--from-index", action="store_true", help="Use the vectors of the current FAISS index.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.from_index:
+        from resources import get_vector_store
+        index = get_vector_store().index
+        corpora = [index.reconstruct_n(0, index.ntotal)]
+    else:
+        corpora = [synthetic_corpus(size) for size in args.sizes]
+
+    results = []
+    for corpus in corpora:
+        results.extend(
+            benchmark_corpus(corpus, make_queries(corpus, args.queries), args.k, args.nprobe, args.ef_search)
+        )
+    print_table(results, args.k)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
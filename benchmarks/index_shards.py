@@ -0,0 +1,160 @@
+"""
+Single index vs per-source shards: search latency, parity and rebuild cost.
+
+Builds a synthetic corpus of --files source files (--size-mb in total) in a
+throwaway directory, with the hash embedder from `benchmarks.stubs`, and
+indexes it once as a single flat index and once sharded. For each layout:
+  * dense search time per query (result cache cleared), unfiltered and
+    restricted to one source; shards are searched one after another and
+    fanned out over threads;
+  * whether the top-k hits equal those of the single index;
+  * how long `process_embeddings` takes after one source file changed.
+
+    python -m benchmarks.index_shards --size-mb 4 --files 32
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import argparse
+import index_shards
+import retrieval
+from benchmarks.stubs import install_stubs
+from benchmarks.suite import corpus_sentences, retrieval_queries, workspace, write_corpus
+
+def search_ms(embeddings, k, sources, repeats):
+    """Best-of-`repeats` mean ms per query of an uncached dense search."""
+    best = float("inf")
+    for _ in range(repeats):
+        elapsed = 0.0
+        for embedding in embeddings:
+            retrieval.search_result_cache.clear()
+            start = time.perf_counter()
+            retrieval.search_many([embedding], k, sources=sources)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed / len(embeddings))
+    return round(best * 1000, 3)
+
+def top_hits(embeddings, k, sources=None):
+    """(similarity, chunk id) hits per query; ties in chunk id order, as layouts break them differently."""
+    retrieval.search_result_cache.clear()
+    return [
+        sorted(((round(similarity, 5), doc.metadata["chunk_id"]) for doc, similarity in hits),
+               key=lambda hit: (-hit[0], hit[1]))
+        for hits in retrieval.search_many(embeddings, k, sources=sources)
+    ]
+
+def same_hits(results, reference):
+    """
+    Equal scores, and equal chunks wherever the choice is not a tie at the
+    k-th place (repeated chunk texts in several sources tie exactly).
+    """
+    for hits, expected in zip(results, reference):
+        if [score for score, _ in hits] != [score for score, _ in expected]:
+            return False
+        cutoff = expected[-1][0] if expected else None
+        if [hit for hit in hits if hit[0] != cutoff] != [hit for hit in expected if hit[0] != cutoff]:
+            return False
+    return True
+
+def change_source(raw_dir, file, sentences):
+    """Append a paragraph to one raw source file."""
+    with open(os.path.join(raw_dir, file), "a", encoding="utf-8") as f:
+        f.write("\n\n" + " ".join(sentences[:20]) + f" Revision {time.time_ns()}.\n")
+
+def rebuild_seconds(raw_dir, file, sentences, sharded):
+    from chunking import process_chunking
+    from data_preprocessing import process_documents
+    from embedding_generation import process_embeddings
+    change_source(raw_dir, file, sentences)
+    process_documents(workers=1)
+    process_chunking()
+    start = time.perf_counter()
+    process_embeddings(workers=1, sharded=sharded)
+    return round(time.perf_counter() - start, 3)
+
+def run_benchmark(size_mb, files, queries, k, repeats, threads):
+    from chunking import process_chunking
+    from data_preprocessing import process_documents
+    from embedding_generation import process_embeddings
+    install_stubs()
+    index_shards.SHARD_SEARCH_THREADS = threads
+    sentences = corpus_sentences()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = os.path.join(tmp, "data", "raw")
+        write_corpus(raw_dir, size_mb, sentences, file_size=int(size_mb * 1024 * 1024 / files))
+        raw_files = sorted(os.listdir(raw_dir))
+        with workspace(tmp):
+            process_documents(workers=1)
+            process_chunking()
+            embeddings = retrieval.embed_queries(retrieval_queries(sentences, queries))
+            source = raw_files[0]
+
+            reference = None
+            for layout in ("single", "sharded"):
+                process_embeddings(workers=1, sharded=layout == "sharded")
+                if layout == "single":
+                    modes = {"single": None}
+                else:
+                    modes = {"sharded, sequential": 1 << 62, "sharded, threads": 0}
+                for name, parallel_min in modes.items():
+                    index_shards.SHARD_PARALLEL_MIN_VECTORS = parallel_min
+                    results = (top_hits(embeddings, k), top_hits(embeddings, k, [source]))
+                    reference = reference or results
+                    rows.append({
+                        "layout": name,
+                        "unfiltered_ms": search_ms(embeddings, k, None, repeats),
+                        "one_source_ms": search_ms(embeddings, k, [source], repeats),
+                        "same_top_k": all(map(same_hits, results, reference)),
+                    })
+
+            # Changing a source only after both layouts were compared
+            rows[-1]["rebuild_one_source_s"] = rebuild_seconds(raw_dir, raw_files[-1], sentences, True)
+            process_embeddings(workers=1, sharded=False)
+            rows[0]["rebuild_one_source_s"] = rebuild_seconds(raw_dir, raw_files[-1], sentences, False)
+            process_embeddings(workers=1, sharded=True)
+            from resources import get_index_shards
+            shards = get_index_shards()
+            vectors = len(shards)
+            largest = max(store.index.ntotal for store in shards.shards.values())
+    return {
+        "files": files, "vectors": vectors, "largest_shard": largest, "queries": queries, "k": k,
+        "threads": index_shards.SHARD_SEARCH_THREADS, "layouts": rows,
+    }
+
+def print_table(result):
+    print(
+        f"{result['files']} sources, {result['vectors']} vectors (largest shard {result['largest_shard']}), "
+        f"{result['queries']} queries, k={result['k']}, {result['threads']} search threads\n"
+    )
+    header = f"{'layout':<20} {'unfiltered ms':>14} {'one source ms':>14} {'same top-k':>11} {'rebuild s':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in result["layouts"]:
+        print(
+            f"{row['layout']:<20} {row['unfiltered_ms']:>14} {row['one_source_ms']:>14} "
+            f"{str(row['same_top_k']):>11} {row.get('rebuild_one_source_s', ''):>10}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--files", type=int, default=32, help="Source files (one shard each).")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--threads", type=int, default=index_shards.SHARD_SEARCH_THREADS, help="Shard search threads."
+    )
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run_benchmark(args.size_mb, args.files, args.queries, args.k, args.repeats, args.threads)
+    print_table(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
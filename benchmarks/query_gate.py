@@ -0,0 +1,101 @@
+"""
+Speed and accuracy of the telecom query gate on a labelled query set.
+
+Compares the previous per-keyword regex loop with the single precompiled
+alternation in `query_gate`, and with --fallback also the embedding
+fallback against the topic centroids at several similarity thresholds
+(this loads the embedding model).
+
+    python -m benchmarks.query_gate
+    python -m benchmarks.query_gate --fallback --thresholds 0.3 0.35 0.4
+"""
+import os
+import re
+import json
+import timeit
+import argparse
+from query_gate import TELECOM_KEYWORDS, matches_telecom_keyword, topic_similarity
+
+LABELLED_QUERIES = os.path.join(os.path.dirname(__file__), "data", "telecom_queries.jsonl")
+
+def load_labelled_queries(path=LABELLED_QUERIES):
+    """(query, is_telecom) pairs from a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(row["query"], row["telecom"]) for row in map(json.loads, f)]
+
+def legacy_is_telecom_query(query):
+    """The gate as it was: one regex built and run per keyword."""
+    query_lower = query.lower()
+    for keyword in TELECOM_KEYWORDS:
+        pattern = rf'\b{re.escape(keyword.lower())}\b'
+        if re.search(pattern, query_lower):
+            return True
+    return False
+
+def score(predictions, labels):
+    """Accuracy, precision and recall of in-scope predictions."""
+    true_pos = sum(p and l for p, l in zip(predictions, labels))
+    predicted = sum(predictions)
+    actual = sum(labels)
+    return {
+        "accuracy": round(sum(p == l for p, l in zip(predictions, labels)) / len(labels), 3),
+        "precision": round(true_pos / predicted, 3) if predicted else 0.0,
+        "recall": round(true_pos / actual, 3) if actual else 0.0,
+    }
+
+def time_per_query_us(gate, queries, repeat=5, number=200):
+    """Best-of-`repeat` microseconds per call over all queries."""
+    best = min(timeit.repeat(lambda: [gate(q) for q in queries], repeat=repeat, number=number))
+    return round(best / (number * len(queries)) * 1e6, 2)
+
+def benchmark_gates(labelled, thresholds=None):
+    queries = [query for query, _ in labelled]
+    labels = [label for _, label in labelled]
+    rows = []
+    for name, gate in (("legacy loop", legacy_is_telecom_query), ("compiled", matches_telecom_keyword)):
+        rows.append({
+            "gate": name,
+            "us_per_query": time_per_query_us(gate, queries),
+            **score([gate(q) for q in queries], labels),
+        })
+
+    if thresholds:
+        from resources import get_topic_centroids
+        from retrieval import embed_queries
+        centroids = get_topic_centroids()
+        if centroids is None:
+            raise SystemExit("No topic centroids found; run embedding_generation first.")
+        keyword_hits = [matches_telecom_keyword(q) for q in queries]
+        similarities = [topic_similarity(e, centroids) for e in embed_queries(queries)]
+        for threshold in thresholds:
+            rows.append({
+                "gate": f"+ centroids >= {threshold}",
+                "us_per_query": None,
+                **score([k or s >= threshold for k, s in zip(keyword_hits, similarities)], labels),
+            })
+    return rows
+
+def print_table(rows):
+    header = f"{'gate':<22} {'us/query':>9} {'accuracy':>9} {'precision':>9} {'recall':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        us = "-" if row["us_per_query"] is None else row["us_per_query"]
+        print(f"{row['gate']:<22} {us:>9} {row['accuracy']:>9} {row['precision']:>9} {row['recall']:>7}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries-file", default=LABELLED_QUERIES, help="Labelled JSONL queries.")
+    parser.add_argument("--fallback", action="store_true", help="Also score the centroid fallback.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.25, 0.3, 0.35, 0.4, 0.45])
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = benchmark_gates(
+        load_labelled_queries(args.queries_file), args.thresholds if args.fallback else None
+    )
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
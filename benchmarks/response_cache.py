@@ -0,0 +1,83 @@
+"""
+Hit rate and latency of the semantic response cache on a repetitive workload.
+
+Replays a Zipf-distributed mix of requests (with case and spacing
+variants, as engineers retype them) through `generate_response`, using the
+stub chat model with a fixed generation latency and a throwaway cache
+file. Then simulates an index rebuild and checks that cached responses are
+invalidated. Paraphrase hits depend on the real embedding model; with the
+stub embedder only identical normalised queries match.
+
+    python -m benchmarks.response_cache --requests 300 --llm-latency 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import numpy as np
+from benchmarks.stubs import install_stubs
+from benchmarks.concurrent_chains import QUERIES
+from response_cache import ResponseCache
+
+DOC_TYPES = ["report", "sop", "summary"]
+
+def variants(query):
+    """Retyped forms of a query that normalise to the same text."""
+    return [query, query.lower(), query.upper(), "  ".join(query.split()) + " "]
+
+def workload(num_requests, seed=0):
+    rng = random.Random(seed)
+    requests = [(query, doc_type) for query in QUERIES for doc_type in DOC_TYPES]
+    weights = [1 / rank for rank in range(1, len(requests) + 1)]
+    return [
+        (rng.choice(variants(query)), doc_type)
+        for query, doc_type in rng.choices(requests, weights, k=num_requests)
+    ]
+
+def run_benchmark(num_requests):
+    import generate_response
+    cache = generate_response.response_cache
+    latencies = {"hit": [], "miss": []}
+    for query, doc_type in workload(num_requests):
+        hits = cache.hits
+        start = time.perf_counter()
+        generate_response.generate_response(query, doc_type)
+        kind = "hit" if cache.hits > hits else "miss"
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    # A rebuilt index must not serve responses generated from the old one
+    real_index_version = generate_response.index_version
+    generate_response.index_version = lambda: ("rebuilt",)
+    misses = cache.misses
+    generate_response.generate_response(QUERIES[0], "report")
+    invalidated = cache.misses > misses and cache.invalidations > 0
+    generate_response.index_version = real_index_version
+
+    return {
+        "requests": num_requests,
+        **{
+            f"{kind}_p50_ms": round(float(np.percentile(values, 50)), 2) if values else None
+            for kind, values in latencies.items()
+        },
+        "invalidated_on_index_change": invalidated,
+        "cache": cache.stats(),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub seconds per generation.")
+    parser.add_argument("--maxsize", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_stubs(
+            llm_latency=args.llm_latency,
+            response_cache=ResponseCache(os.path.join(tmp, "response_cache.sqlite"), maxsize=args.maxsize)
+        )
+        result = run_benchmark(args.requests)
+    print(json.dumps(result, indent=4))
+    sys.exit(0 if result["invalidated_on_index_change"] else 1)
@@ -0,0 +1,107 @@
+"""
+Latency and exact-match quality of the dense, lexical and hybrid retrieval modes.
+
+Queries are the numbered section headings of the chunk store ("1.5.2
+PREDESIGN SITE SURVEY"), plus any given with --queries-file. A query counts
+as a hit when one of its top-k chunks contains the heading verbatim.
+Latency is per single query through `retrieval.search_queries` with the
+query caches cleared, so every query pays for embedding and search.
+
+    python -m benchmarks.retrieval_modes
+    python -m benchmarks.retrieval_modes --queries-file queries.txt --k 5
+"""
+import re
+import json
+import time
+import argparse
+import numpy as np
+import resources
+import retrieval
+from resources import get_chunk_store
+
+# "1.5.2 PREDESIGN SITE SURVEY": a section number and an upper-case title
+HEADING = re.compile(r"\b\d+(?:\.\d+)+ [A-Z][A-Z ]{4,}[A-Z]")
+
+def heading_queries(limit, seed=0):
+    """Distinct section headings from the chunk store, sampled reproducibly."""
+    chunk_store = get_chunk_store()
+    headings = set()
+    for source in chunk_store.sources:
+        for chunk in chunk_store.iter_source(source):
+            headings.update(HEADING.findall(chunk.text))
+    headings = sorted(headings)
+    rng = np.random.default_rng(seed)
+    if len(headings) > limit:
+        headings = [headings[i] for i in sorted(rng.choice(len(headings), limit, replace=False))]
+    return headings
+
+def measure_mode(queries, k, mode, expected=None):
+    """Run queries one at a time in `mode`; return latencies (ms) and the hit rate."""
+    latencies = np.empty(len(queries))
+    hits = 0
+    for i, query in enumerate(queries):
+        retrieval.query_embedding_cache.clear()
+        retrieval.search_result_cache.clear()
+        start = time.perf_counter()
+        results = retrieval.search_queries([query], k, mode=mode)[0]
+        latencies[i] = (time.perf_counter() - start) * 1000
+        if expected and any(expected[i] in doc.page_content for doc, _ in results):
+            hits += 1
+    return latencies, hits / len(queries) if expected else None
+
+def benchmark_modes(queries, k, expected=None):
+    rows = []
+    # Lexical first, to show it never loads the embedding model
+    for mode in ("lexical", "dense", "hybrid"):
+        start = time.perf_counter()
+        retrieval.search_queries([queries[0]], k, mode=mode)
+        first_query_ms = (time.perf_counter() - start) * 1000
+        latencies, hit_rate = measure_mode(queries, k, mode, expected)
+        rows.append({
+            "mode": mode,
+            "queries": len(queries),
+            "first_query_ms": round(first_query_ms, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            f"hit@{k}": None if hit_rate is None else round(hit_rate, 3),
+            "embedding_model_loaded": "embedding_model" in resources._resources,
+        })
+    return rows
+
+def print_table(rows, k):
+    header = (
+        f"{'mode':<8} {'queries':>7} {'first ms':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{f'hit@{k}':>6} {'model loaded':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        hit_rate = "-" if row[f"hit@{k}"] is None else row[f"hit@{k}"]
+        print(
+            f"{row['mode']:<8} {row['queries']:>7} {row['first_query_ms']:>9} {row['p50_ms']:>8} "
+            f"{row['p99_ms']:>8} {hit_rate:>6} {str(row['embedding_model_loaded']):>12}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=100, help="Section headings to sample.")
+    parser.add_argument("--queries-file", help="Extra queries, one per line (no hit rate).")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    headings = heading_queries(args.queries)
+    results = benchmark_modes(headings, args.k, expected=headings)
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        for row in benchmark_modes(queries, args.k):
+            row["mode"] += "*"
+            results.append(row)
+    print_table(results, args.k)
+    if args.queries_file:
+        print(f"* queries from {args.queries_file}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,151 @@
+"""
+Load test of the HTTP service (`server`), in-process on a free port.
+
+Uses the echo chat model and a hash embedder that sleeps like a forward
+pass (--embed-ms per call plus --embed-item-ms per query) from
+`benchmarks.stubs`, so it runs offline:
+  * /retrieve from --clients keep-alive connections, each query unique so
+    no cache answers it, with query micro-batching off and on: p50/p99,
+    requests/s and embedding-model calls;
+  * /generate flooded by more clients than the generate threads and queue
+    hold: how many got 503 at once, and the latency of those served.
+
+    python -m benchmarks.server_load --clients 32 --requests 20
+"""
+import json
+import time
+import logging
+import argparse
+import threading
+import http.client
+import numpy as np
+import retrieval
+import server
+from benchmarks.stubs import install_stubs
+from benchmarks.concurrent_chains import QUERIES
+
+class Client:
+    """One keep-alive connection to the service."""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def post(self, path, body):
+        self.connection.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def get(self, path):
+        self.connection.request("GET", path)
+        response = self.connection.getresponse()
+        return response.status, response.read()
+
+def run_clients(port, clients, work):
+    """Run `work(client, index)` on `clients` threads; return their results, flattened."""
+    results = [None] * clients
+
+    def run(index):
+        results[index] = work(Client(port), index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [item for result in results for item in result], time.perf_counter() - start
+
+def retrieve_load(port, clients, requests, label):
+    calls_before = len(embed_calls)
+
+    def work(client, index):
+        latencies = []
+        for i in range(requests):
+            query = f"{QUERIES[(index + i) % len(QUERIES)]} {label} client {index} request {i}"
+            start = time.perf_counter()
+            status, _ = client.post("/retrieve", {"query": query, "top_k": 3, "threshold": None})
+            assert status == 200, status
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    latencies, elapsed = run_clients(port, clients, work)
+    return {
+        "batching": label,
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "embed_calls": len(embed_calls) - calls_before,
+    }
+
+def generate_flood(port, clients):
+    def work(client, index):
+        start = time.perf_counter()
+        status, _ = client.post("/generate", {"query": QUERIES[index % len(QUERIES)], "doc_type": "summary"})
+        return [(status, time.perf_counter() - start)]
+
+    results, elapsed = run_clients(port, clients, work)
+    served = [seconds for status, seconds in results if status == 200]
+    rejected = [seconds for status, seconds in results if status == 503]
+    return {
+        "clients": clients,
+        "capacity": server.GENERATE_THREADS + server.GENERATE_QUEUE_SIZE,
+        "served": len(served),
+        "rejected": len(rejected),
+        "rejected_max_ms": round(max(rejected) * 1000, 2) if rejected else None,
+        "served_p99_ms": round(float(np.percentile(served, 99)) * 1000, 2),
+        "seconds": round(elapsed, 2),
+    }
+
+# Embedding model calls, to show how many requests each one served
+embed_calls = []
+
+def run_benchmark(clients, requests, embed_ms, embed_item_ms, llm_latency, flood):
+    install_stubs(
+        llm_latency=llm_latency, embed_latency=embed_ms / 1000, embed_item_latency=embed_item_ms / 1000
+    )
+    import resources
+    model = resources.get_embedding_model()
+    embed_documents = model.embed_documents
+    embed_query = model.embed_query
+    object.__setattr__(model, "embed_documents", lambda texts: embed_calls.append(len(texts)) or embed_documents(texts))
+    object.__setattr__(model, "embed_query", lambda text: embed_calls.append(1) or embed_query(text))
+
+    httpd = server.ServiceHTTPServer(("127.0.0.1", 0), server.ServiceHandler)
+    port = httpd.server_address[1]
+    server.start_worker(warm_up=False)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Client(port).post("/retrieve", {"query": "warm up", "threshold": None})
+
+    batcher = retrieval.query_batcher
+    retrieval.query_batcher = None
+    rows = [retrieve_load(port, clients, requests, "off")]
+    retrieval.query_batcher = batcher
+    rows.append(retrieve_load(port, clients, requests, "on"))
+
+    result = {"retrieve": rows, "generate_flood": generate_flood(port, flood)}
+    status, health = Client(port).get("/health")
+    result["health"] = json.loads(health)
+    httpd.shutdown()
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="/retrieve requests per client.")
+    parser.add_argument("--embed-ms", type=float, default=8.0, help="Stub embedder ms per call.")
+    parser.add_argument("--embed-item-ms", type=float, default=0.5, help="Stub embedder ms per query.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub seconds per generation.")
+    parser.add_argument("--flood", type=int, default=64, help="Concurrent /generate clients.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run_benchmark(
+        args.clients, args.requests, args.embed_ms, args.embed_item_ms, args.llm_latency, args.flood
+    )
+    print(json.dumps(result, indent=4))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
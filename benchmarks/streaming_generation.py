@@ -0,0 +1,89 @@
+"""
+Time-to-first-token and concurrency bound of `astream_response`.
+
+Runs concurrent streamed requests against the streaming echo chat model
+from `benchmarks.stubs` and checks that:
+  * the streamed text equals what `generate_response` returns for the
+    same request, and
+  * no more than MAX_CONCURRENT_GENERATIONS streams ran at once.
+Reports time to first token against total time per request, i.e. what
+the UI now waits on versus what it waited on before. Exits non-zero if a
+check fails.
+
+    python -m benchmarks.streaming_generation --requests 32 --token-latency 0.002
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from benchmarks.stubs import install_stubs
+from benchmarks.concurrent_chains import QUERIES, DOC_TYPES
+
+async def timed_stream(query, doc_type, k):
+    """Stream one request; return its text and event timings (seconds)."""
+    from generate_response import astream_response
+    start = time.perf_counter()
+    first_token = None
+    tokens = []
+    async for kind, value in astream_response(query, doc_type, k):
+        if kind == "token":
+            first_token = first_token or time.perf_counter()
+            tokens.append(value)
+    end = time.perf_counter()
+    # Tokens only flow while the request holds a generation slot
+    return "".join(tokens), {
+        "ttft": first_token - start, "total": end - start, "slot": (first_token, end)
+    }
+
+def max_overlap(intervals):
+    """Largest number of (start, end) intervals open at the same time."""
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    active = peak = 0
+    for _, delta in events:
+        active += delta
+        peak = max(peak, active)
+    return peak
+
+async def run_streams(requests):
+    return await asyncio.gather(*(timed_stream(*request) for request in requests))
+
+def run_check(num_requests, max_k=5):
+    from generate_response import MAX_CONCURRENT_GENERATIONS, generate_response
+    requests = [
+        (QUERIES[i % len(QUERIES)], DOC_TYPES[i % len(DOC_TYPES)], 1 + i % max_k)
+        for i in range(num_requests)
+    ]
+    results = asyncio.run(run_streams(requests))
+
+    mismatches = sum(
+        text != generate_response(*request)[0] for request, (text, _) in zip(requests, results)
+    )
+    timings = [timing for _, timing in results]
+    concurrency = max_overlap([timing["slot"] for timing in timings])
+    ttft = np.array([timing["ttft"] for timing in timings]) * 1000
+    total = np.array([timing["total"] for timing in timings]) * 1000
+    return {
+        "requests": num_requests,
+        "max_concurrent_generations": MAX_CONCURRENT_GENERATIONS,
+        "observed_concurrency": concurrency,
+        "mismatches": int(mismatches),
+        "ttft_p50_ms": round(float(np.percentile(ttft, 50)), 1),
+        "ttft_p99_ms": round(float(np.percentile(ttft, 99)), 1),
+        "total_p50_ms": round(float(np.percentile(total, 50)), 1),
+        "total_p99_ms": round(float(np.percentile(total, 99)), 1),
+        "passed": mismatches == 0 and concurrency <= MAX_CONCURRENT_GENERATIONS,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub seconds before the first token.")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="Stub seconds between tokens.")
+    args = parser.parse_args()
+
+    install_stubs(llm_latency=args.llm_latency, token_latency=args.token_latency)
+    result = run_check(args.requests)
+    print(json.dumps(result, indent=4))
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,118 @@
+"""
+Local stand-ins for the embedding model and Mistral, so checks and
+benchmarks run offline and their answers can be verified exactly.
+
+    from benchmarks.stubs import install_stubs
+    install_stubs()   # before the first retrieval or generation call
+"""
+import re
+import time
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import resources
+
+DIM = 384  # all-MiniLM-L6-v2
+
+def split_tokens(text):
+    """Word-sized pieces that concatenate back to `text`."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+class EchoChatModel(BaseChatModel):
+    """
+    Chat model that answers with its prompt, after `latency` seconds.
+
+    Streaming yields the prompt word by word, `token_latency` seconds apart.
+    """
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=messages[-1].content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for token in split_tokens(messages[-1].content):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for token in split_tokens(messages[-1].content):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+_forward_pass_lock = threading.Lock()
+
+class TimedFakeEmbedding(DeterministicFakeEmbedding):
+    """
+    Hash embedder that takes as long as a model forward pass would:
+    `call_latency` seconds per call plus `item_latency` per text. Calls run
+    one at a time, as forward passes that each keep every core busy do.
+    """
+    call_latency: float = 0.0
+    item_latency: float = 0.0
+
+    def _sleep(self, texts):
+        if self.call_latency or self.item_latency:
+            with _forward_pass_lock:
+                time.sleep(self.call_latency + self.item_latency * texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._sleep(len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._sleep(1)
+        return super().embed_query(text)
+
+def install_stubs(
+    llm_latency=0.0, token_latency=0.0, embeddings=True, response_cache=None,
+    embed_latency=0.0, embed_item_latency=0.0
+):
+    """
+    Register the echo chat model (and a hash-based embedder) as shared resources.
+
+    The on-disk response cache is replaced by `response_cache` (None turns
+    it off), so stub answers never reach the real cache.
+    """
+    import generate_response
+    resources.override("llm", EchoChatModel(latency=llm_latency, token_latency=token_latency))
+    if embeddings:
+        resources.override("embedding_model", TimedFakeEmbedding(
+            size=DIM, call_latency=embed_latency, item_latency=embed_item_latency
+        ))
+    generate_response.response_cache = response_cache
@@ -0,0 +1,324 @@
+"""
+Offline end-to-end benchmark suite: ingestion, retrieval and generation.
+
+Runs without the HuggingFace model or a Mistral key, using the hash
+embedder and echo chat model from `benchmarks.stubs`. For each synthetic
+corpus size (sentences of the bundled processed corpus, shuffled into raw
+.txt files) it runs the pipeline in a throwaway working directory and
+measures:
+  * ingestion: `process_documents`, `process_chunking` and
+    `process_embeddings` from scratch, then again with nothing changed;
+  * retrieval: single-query p50/p99 latency (caches cleared) and QPS for
+    each mode, sequential, batched and from concurrent threads;
+  * generation: `generate_response` p50/p99 latency and throughput at
+    each concurrency level, with a fixed stub LLM latency and no
+    response cache.
+
+Results are written as JSON with --json; --compare reports metrics that
+got worse than a previous results file by more than --tolerance, and
+exits non-zero if any did. Timings with the stub embedder measure the
+pipeline around the model, not the model; PDF extraction is not covered.
+
+    python -m benchmarks.suite --sizes 0.25 1 4 --json results.json
+    python -m benchmarks.suite --json new.json --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import argparse
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import resources
+import retrieval
+from benchmarks.stubs import install_stubs
+from benchmarks.concurrent_chains import QUERIES, DOC_TYPES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_CORPUS = os.path.join(REPO_DIR, "data", "processed")
+RAW_FILE_SIZE = 256 * 1024
+
+# Metrics where a higher value is better; every other timing is lower-better
+HIGHER_IS_BETTER = ("qps", "rps", "mb_per_sec", "chunks_per_sec")
+# Fields that identify a row when comparing two result files
+ROW_KEYS = ("stage", "size_mb", "run", "mode", "method", "concurrency")
+# Stages this quick in both runs are timer noise, not worth comparing
+NOISE_FLOOR_SECONDS = 0.01
+
+def corpus_sentences():
+    """Sentences of the bundled processed corpus, to build synthetic text from."""
+    sentences = []
+    for file in sorted(os.listdir(SOURCE_CORPUS)):
+        with open(os.path.join(SOURCE_CORPUS, file), "r", encoding="utf-8") as f:
+            sentences.extend(s.strip() + "." for s in f.read().split(".") if len(s.split()) >= 4)
+    return sentences
+
+def write_corpus(directory, size_mb, sentences, seed=0, file_size=RAW_FILE_SIZE):
+    """Write about `size_mb` MB of shuffled sentences as raw .txt files; return their count."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    target = int(size_mb * 1024 * 1024)
+    written = files = 0
+    while written < target:
+        parts = []
+        length = 0
+        while length < min(file_size, target - written):
+            sentence = rng.choice(sentences)
+            # Blank lines every few sentences, like extracted page text
+            parts.append(sentence + ("\n\n" if rng.random() < 0.2 else " "))
+            length += len(parts[-1])
+        with open(os.path.join(directory, f"synthetic_{files:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        written += length
+        files += 1
+    return files
+
+@contextmanager
+def workspace(directory):
+    """Run the pipeline with `directory` as the repo root, on fresh resources."""
+    import embedding_generation
+    from langchain.storage import LocalFileStore
+    previous_dir = os.getcwd()
+    previous_cache = embedding_generation.embedding_cache
+    os.chdir(directory)
+    # The pipeline modules create these on import, relative to the repo root
+    for path in ("data/processed", "data/chunks", embedding_generation.VECTORSTORE_DIR):
+        os.makedirs(path, exist_ok=True)
+    # The embedding cache path was resolved when the module was imported
+    embedding_generation.embedding_cache = LocalFileStore(
+        os.path.abspath(embedding_generation.EMBEDDING_CACHE_DIR)
+    )
+    for name in ("vector_store", "chunk_store", "lexical_index", "topic_centroids"):
+        resources.reset(name)
+    retrieval.query_embedding_cache.clear()
+    retrieval.search_result_cache.clear()
+    try:
+        yield
+    finally:
+        os.chdir(previous_dir)
+        embedding_generation.embedding_cache = previous_cache
+        for name in ("vector_store", "chunk_store", "lexical_index", "topic_centroids"):
+            resources.reset(name)
+
+def percentile_ms(seconds, q):
+    return round(float(np.percentile(seconds, q)) * 1000, 3)
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def benchmark_ingestion(size_mb, raw_bytes):
+    """Time each ingestion stage from scratch, then with nothing changed."""
+    from chunk_store import ChunkStore
+    from chunking import process_chunking
+    from data_preprocessing import process_documents
+    from embedding_generation import process_embeddings
+    rows = []
+    for run in ("cold", "unchanged"):
+        timings = {
+            "process_documents": timed(process_documents, workers=1),
+            "process_chunking": timed(process_chunking),
+            "process_embeddings": timed(process_embeddings, workers=1, index_type="flat"),
+        }
+        chunks = len(ChunkStore())
+        for method, seconds in timings.items():
+            row = {"stage": "ingestion", "size_mb": size_mb, "run": run, "method": method,
+                   "seconds": round(seconds, 3)}
+            if method == "process_documents":
+                row["mb_per_sec"] = round(raw_bytes / 1e6 / seconds, 2)
+            else:
+                row["chunks"] = chunks
+                row["chunks_per_sec"] = round(chunks / seconds, 1)
+            rows.append(row)
+    return rows
+
+def retrieval_queries(sentences, count, seed=1):
+    """Queries made of the first words of corpus sentences."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(sentences).split()[:8]) for _ in range(count)]
+
+def clear_query_caches():
+    retrieval.query_embedding_cache.clear()
+    retrieval.search_result_cache.clear()
+
+def benchmark_retrieval(size_mb, queries, k, threads, batch_size):
+    rows = []
+    for mode in retrieval.RETRIEVAL_MODES:
+        retrieval.search_queries(queries[:1], k, mode=mode)  # load the indexes
+
+        latencies = []
+        for query in queries:
+            clear_query_caches()
+            latencies.append(timed(retrieval.retrieve_relevant_documents, query, k, None, mode=mode))
+
+        clear_query_caches()
+        batched = sum(
+            timed(retrieval.retrieve_relevant_documents_batch, queries[i:i + batch_size], k, None, mode=mode)
+            for i in range(0, len(queries), batch_size)
+        )
+
+        clear_query_caches()
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda query: retrieval.retrieve_relevant_documents(query, k, None, mode=mode), queries))
+            concurrent = time.perf_counter() - start
+
+        rows.append({
+            "stage": "retrieval", "size_mb": size_mb, "mode": mode, "k": k,
+            "queries": len(queries),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+            "qps": round(len(queries) / sum(latencies), 1),
+            "batch_qps": round(len(queries) / batched, 1),
+            "threaded_qps": round(len(queries) / concurrent, 1),
+            "threads": threads,
+        })
+    return rows
+
+def benchmark_generation(size_mb, concurrency_levels, requests_per_level, llm_latency, k):
+    from generate_response import generate_response
+    rows = []
+    rng = random.Random(2)
+    for concurrency in concurrency_levels:
+        requests = [
+            (rng.choice(QUERIES), rng.choice(DOC_TYPES), k)
+            for _ in range(max(requests_per_level, concurrency))
+        ]
+        clear_query_caches()
+
+        def timed_request(request):
+            start = time.perf_counter()
+            generate_response(*request)
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            latencies = list(pool.map(timed_request, requests))
+            elapsed = time.perf_counter() - start
+        rows.append({
+            "stage": "generation", "size_mb": size_mb, "concurrency": concurrency,
+            "requests": len(requests), "llm_latency_ms": round(llm_latency * 1000, 1),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+            "rps": round(len(requests) / elapsed, 1),
+        })
+    return rows
+
+def run_suite(args):
+    install_stubs(llm_latency=args.llm_latency)
+    sentences = corpus_sentences()
+    queries = retrieval_queries(sentences, args.queries)
+    results = []
+    for size_mb in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            raw_dir = os.path.join(tmp, "data", "raw")
+            files = write_corpus(raw_dir, size_mb, sentences)
+            raw_bytes = sum(entry.stat().st_size for entry in os.scandir(raw_dir))
+            with workspace(tmp):
+                rows = benchmark_ingestion(size_mb, raw_bytes)
+                for row in rows:
+                    row["files"] = files
+                results += rows
+                results += benchmark_retrieval(size_mb, queries, args.k, args.threads, args.batch_size)
+                if size_mb == max(args.sizes):
+                    results += benchmark_generation(
+                        size_mb, args.concurrency, args.requests, args.llm_latency, args.k
+                    )
+            # Nothing may outlive the workspace it was opened in
+            resources.reset("vector_store")
+    return results
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+def row_key(row):
+    return tuple((key, row[key]) for key in ROW_KEYS if key in row)
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse than in `baseline` by more than `tolerance` (a fraction)."""
+    previous = {row_key(row): row for row in baseline}
+    regressions = []
+    for row in results:
+        old = previous.get(row_key(row))
+        if old is None or max(row.get("seconds", 1), old.get("seconds", 1)) < NOISE_FLOOR_SECONDS:
+            continue
+        for metric, value in row.items():
+            if metric in ROW_KEYS or not isinstance(value, (int, float)) or not old.get(metric):
+                continue
+            if not metric.endswith(("_ms", "seconds")) and not metric.endswith(HIGHER_IS_BETTER):
+                continue
+            higher_is_better = metric.endswith(HIGHER_IS_BETTER)
+            change = value / old[metric] - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    **dict(row_key(row)), "metric": metric,
+                    "baseline": old[metric], "current": value, "change_pct": round(100 * change, 1),
+                })
+    return regressions
+
+def print_table(results):
+    for stage in ("ingestion", "retrieval", "generation"):
+        rows = [row for row in results if row["stage"] == stage]
+        if not rows:
+            continue
+        columns = list(dict.fromkeys(key for row in rows for key in row if key != "stage"))
+        widths = [max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+        print(f"\n{stage}")
+        print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+        for row in rows:
+            print("  ".join(str(row.get(column, "")).rjust(width) for column, width in zip(columns, widths)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.25, 1, 4], help="Corpus sizes in MB.")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per mode.")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8, help="Threads for concurrent retrieval.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="generate_response calls per concurrency level.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub seconds per generation.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Previous results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction.")
+    args = parser.parse_args()
+
+    # Keep per-file and per-request logging out of the tables
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    output = {"meta": metadata(args), "results": run_suite(args)}
+    print_table(output["results"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(output["results"], baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.compare}")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1 if regressions else 0)
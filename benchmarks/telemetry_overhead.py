@@ -0,0 +1,101 @@
+"""
+Overhead of `telemetry` tracing, and what a traced request looks like.
+
+Times a span with a counter in it with tracing off and on, then the same
+`generate_response` workload (echo chat model and hash embedder from
+`benchmarks.stubs`, no response cache) with tracing off and on. Prints one
+request's trace, i.e. the JSON log line, and the start of the Prometheus
+text the metrics endpoint serves.
+
+    python -m benchmarks.telemetry_overhead --requests 300
+"""
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import telemetry
+from benchmarks.stubs import install_stubs
+from benchmarks.concurrent_chains import QUERIES, DOC_TYPES
+
+class TraceCollector(logging.Handler):
+    """Keeps the JSON trace lines (unparsed) instead of printing them."""
+
+    def __init__(self):
+        super().__init__()
+        self.traces = []
+
+    def emit(self, record):
+        self.traces.append(record.getMessage())
+
+def span_ns(iterations, enabled):
+    """Nanoseconds per `with span(): count()` inside a trace."""
+    telemetry.enable(enabled)
+    trace = telemetry.start_trace("benchmark")
+    with trace.activate():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with telemetry.span("stage"):
+                telemetry.count("events")
+        elapsed = time.perf_counter() - start
+    telemetry.enable(False)
+    return elapsed / iterations * 1e9
+
+def request_latencies(requests, enabled):
+    from generate_response import generate_response
+    telemetry.enable(enabled)
+    latencies = []
+    for query, doc_type in requests:
+        start = time.perf_counter()
+        generate_response(query, doc_type, k=2)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    telemetry.enable(False)
+    return latencies
+
+def run_benchmark(num_requests, iterations, rounds=5):
+    collector = TraceCollector()
+    telemetry.logger.addHandler(collector)
+    telemetry.logger.propagate = False
+
+    requests = [
+        (QUERIES[i % len(QUERIES)], DOC_TYPES[i % len(DOC_TYPES)]) for i in range(num_requests)
+    ]
+    # Warm caches and chains, then alternate so drift hits both settings alike
+    request_latencies(requests, enabled=False)
+    latencies = {False: [], True: []}
+    for _ in range(rounds):
+        for enabled in (False, True):
+            latencies[enabled] += request_latencies(requests, enabled)
+
+    def p50(values):
+        return round(float(np.percentile(values, 50)), 1)
+
+    traces = [json.loads(line) for line in collector.traces[-3:]]
+    traces = [trace for trace in traces if trace["trace"] == "generate_response"]
+    return {
+        "span_ns_disabled": round(min(span_ns(iterations, False) for _ in range(rounds)), 1),
+        "span_ns_enabled": round(min(span_ns(iterations, True) for _ in range(rounds)), 1),
+        "requests": num_requests * rounds,
+        "request_p50_us_disabled": p50(latencies[False]),
+        "request_p50_us_enabled": p50(latencies[True]),
+        "traces_logged": len(collector.traces),
+        "example_trace": traces[-1] if traces else None,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=100000, help="Spans timed per setting.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    # Per-request context logging would drown the output
+    logging.getLogger().setLevel(logging.WARNING)
+    install_stubs()
+    result = run_benchmark(args.requests, args.iterations)
+    print(json.dumps(result, indent=4))
+    print("\n".join(telemetry.render_prometheus().splitlines()[:16]))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
@@ -0,0 +1,120 @@
+import os
+import re
+import hashlib
+import numpy as np
+from lexical_index import tokenize
+from manifest import hash_text
+
+# Chunks are dropped at ingestion when they are mostly boilerplate, or repeat
+# (exactly or nearly) a chunk already kept from the same source
+CHUNK_FILTER_ENABLED = os.getenv("CHUNK_FILTER_ENABLED", "1") == "1"
+# Minimum share of a chunk's characters that are not boilerplate
+MIN_INFORMATION_SCORE = float(os.getenv("MIN_INFORMATION_SCORE", "0.5"))
+# Minimum words left once boilerplate is removed
+MIN_CONTENT_WORDS = 5
+# Chunks whose SimHash fingerprints differ in at most this many bits are near-duplicates
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "3"))
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+# Table-of-contents dot leaders and the page number after them
+DOT_LEADER = re.compile(r"(?:\s*\.){4,}\s*\d*")
+BOILERPLATE = re.compile(
+    rf"{DOT_LEADER.pattern}|this page (?:is )?intentionally (?:left )?blank\.?", re.IGNORECASE
+)
+WORD = re.compile(r"[A-Za-z]{2,}")
+
+REASONS = ("junk", "duplicate", "near_duplicate")
+
+def information_score(text):
+    """Share of a chunk's characters outside dot leaders and blank-page notices."""
+    if not text:
+        return 0.0
+    boilerplate = sum(len(match.group()) for match in BOILERPLATE.finditer(text))
+    return 1 - boilerplate / len(text)
+
+def content_words(text):
+    """Number of words left in a chunk once boilerplate is removed."""
+    return len(WORD.findall(BOILERPLATE.sub(" ", text)))
+
+def is_junk(text):
+    """True if a chunk carries too little information to be worth indexing."""
+    return information_score(text) < MIN_INFORMATION_SCORE or content_words(text) < MIN_CONTENT_WORDS
+
+def simhash(text):
+    """64-bit SimHash of a text's word 3-gram shingles."""
+    tokens = tokenize(text)
+    shingles = {
+        " ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))
+    }
+    hashes = np.array([
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles
+    ], dtype=np.uint64)
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    # A bit is set when most shingle hashes have it set
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+def filter_signature():
+    """Settings that decide which chunks are dropped, recorded in the manifest."""
+    if not CHUNK_FILTER_ENABLED:
+        return None
+    return f"score={MIN_INFORMATION_SCORE},words={MIN_CONTENT_WORDS},distance={NEAR_DUPLICATE_DISTANCE}"
+
+class ChunkFilter:
+    """
+    Drop junk, duplicate and near-duplicate chunks of one source.
+
+    Near-duplicates are found with SimHash: fingerprints are split into
+    NEAR_DUPLICATE_DISTANCE + 1 bands, so any two within that Hamming
+    distance share at least one band and only chunks sharing a band are
+    compared. Counts and bytes of dropped chunks are kept per reason.
+    """
+
+    def __init__(self, enabled=CHUNK_FILTER_ENABLED, max_distance=NEAR_DUPLICATE_DISTANCE):
+        self.enabled = enabled
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        bounds = [SIMHASH_BITS * i // bands for i in range(bands + 1)]
+        self._bands = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self._hashes = set()
+        self._buckets = {}
+        self.kept = 0
+        self.dropped = dict.fromkeys(REASONS, 0)
+        self.bytes_dropped = 0
+
+    def _near_duplicate(self, fingerprint):
+        keys = [(band, (fingerprint >> low) & mask) for band, (low, mask) in enumerate(self._bands)]
+        for key in keys:
+            for other in self._buckets.get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        for key in keys:
+            self._buckets.setdefault(key, []).append(fingerprint)
+        return False
+
+    def check(self, text):
+        """Return why a chunk should be dropped, or None to keep (and remember) it."""
+        reason = None
+        if self.enabled:
+            chunk_hash = hash_text(text)
+            if is_junk(text):
+                reason = "junk"
+            elif chunk_hash in self._hashes:
+                reason = "duplicate"
+            elif self._near_duplicate(simhash(text)):
+                reason = "near_duplicate"
+            else:
+                self._hashes.add(chunk_hash)
+        if reason is None:
+            self.kept += 1
+        else:
+            self.dropped[reason] += 1
+            self.bytes_dropped += len(text.encode("utf-8"))
+        return reason
+
+    def stats(self):
+        """Kept and dropped chunk counts, and bytes of dropped text, as a dict."""
+        return {"kept": self.kept, **self.dropped, "bytes": self.bytes_dropped}
@@ -0,0 +1,217 @@
+import os
+import json
+import mmap
+import struct
+from collections import namedtuple
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# Chunk store layout (all in data/chunks):
+#   chunks.bin        UTF-8 chunk texts written back to back
+#   chunks.idx        one fixed-size record per chunk (see RECORD), memory-mapped
+#   chunks.meta.json  chunk ids and source names, in record order
+CHUNK_STORE_DIR = "data/chunks"
+DATA_FILE = "chunks.bin"
+INDEX_FILE = "chunks.idx"
+META_FILE = "chunks.meta.json"
+STORE_VERSION = 1
+
+# byte offset, byte length, source number, char start, char end
+RECORD = struct.Struct("<QIIQQ")
+
+Chunk = namedtuple("Chunk", ["id", "text", "source", "start", "end"])
+
+def store_exists(directory=CHUNK_STORE_DIR):
+    """True if a complete chunk store is present in `directory`."""
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+def _map_file(path):
+    """Memory-map a file read-only; empty files map to empty bytes."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class ChunkStore:
+    """
+    Read-only view of the chunk store.
+
+    Only the id/source table is loaded up front; chunk texts and offsets are
+    read from memory-mapped files when a chunk is requested, so opening the
+    store costs the same however large the corpus is.
+    """
+
+    def __init__(self, directory=CHUNK_STORE_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported chunk store version: {meta.get('version')}")
+
+        self.ids = meta["ids"]
+        self.sources = meta["sources"]
+        self._source_ranges = {
+            source: tuple(span) for source, span in meta["source_ranges"].items()
+        }
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._data = _map_file(os.path.join(directory, DATA_FILE))
+        self._index = _map_file(os.path.join(directory, INDEX_FILE))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._positions
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._index, position * RECORD.size)
+
+    def _read(self, position):
+        offset, length, source, start, end = self._record(position)
+        text = bytes(self._data[offset:offset + length]).decode("utf-8")
+        return Chunk(self.ids[position], text, self.sources[source], start, end)
+
+    def get(self, chunk_id):
+        """Return the chunk with this id, raising KeyError if it is unknown."""
+        return self._read(self._positions[chunk_id])
+
+    def get_many(self, chunk_ids):
+        """Return chunks for several ids, in the order given."""
+        return [self.get(chunk_id) for chunk_id in chunk_ids]
+
+    def source_ids(self, source):
+        """Return the ids of one source's chunks, in document order."""
+        first, count = self._source_ranges.get(source, (0, 0))
+        return self.ids[first:first + count]
+
+    def iter_source(self, source):
+        """Yield one source's chunks lazily, in document order."""
+        first, count = self._source_ranges.get(source, (0, 0))
+        for position in range(first, first + count):
+            yield self._read(position)
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+class ChunkStoreWriter:
+    """
+    Write a new chunk store next to the current one and swap it in on close.
+
+    Chunks of one source must be added consecutively. A source that failed
+    half-way can be dropped with `discard_source`; its bytes stay in the data
+    file until the next rewrite but are no longer indexed.
+    """
+
+    def __init__(self, directory=CHUNK_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._data = open(os.path.join(directory, DATA_FILE + ".tmp"), "wb")
+        self._records = []
+        self._ids = []
+        self._sources = []
+        self._source_ranges = {}
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def _source_number(self, source):
+        if not self._sources or self._sources[-1] != source:
+            if source in self._source_ranges:
+                raise ValueError(f"Chunks of {source} must be added consecutively.")
+            self._source_ranges[source] = [len(self._ids), 0]
+            self._sources.append(source)
+        return len(self._sources) - 1
+
+    def add(self, chunk_id, text, source, start, end):
+        """Append one chunk."""
+        data = text.encode("utf-8")
+        number = self._source_number(source)
+        self._data.write(data)
+        self._records.append(RECORD.pack(self._offset, len(data), number, start, end))
+        self._ids.append(chunk_id)
+        self._source_ranges[source][1] += 1
+        self._offset += len(data)
+
+    def copy_source(self, store, source):
+        """Copy an unchanged source's chunks over from an existing store."""
+        for chunk in store.iter_source(source):
+            self.add(chunk.id, chunk.text, chunk.source, chunk.start, chunk.end)
+
+    def discard_source(self, source):
+        """Forget the chunks added so far for `source`."""
+        if source not in self._source_ranges:
+            return
+        first, _ = self._source_ranges.pop(source)
+        del self._records[first:]
+        del self._ids[first:]
+        self._sources.remove(source)
+
+    def commit(self):
+        """Flush all files and atomically replace the previous store."""
+        self._data.close()
+        index_tmp = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(index_tmp, "wb") as f:
+            f.write(b"".join(self._records))
+
+        meta_tmp = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "ids": self._ids,
+                "sources": self._sources,
+                "source_ranges": self._source_ranges,
+            }, f)
+
+        # Metadata goes last: `store_exists` only reports the new store once
+        # its data and records are in place
+        for name in (DATA_FILE, INDEX_FILE, META_FILE):
+            path = os.path.join(self.directory, name)
+            os.replace(path + ".tmp", path)
+
+    def abort(self):
+        """Discard everything written by this writer."""
+        self._data.close()
+        for name in (DATA_FILE, INDEX_FILE, META_FILE):
+            tmp_path = os.path.join(self.directory, name + ".tmp")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def to_document(chunk):
+    """LangChain document for a chunk, with its source and id as metadata."""
+    return Document(
+        id=chunk.id,
+        page_content=chunk.text,
+        metadata={"source": chunk.source, "chunk_id": chunk.id}
+    )
+
+class ChunkStoreDocstore(Docstore, AddableMixin):
+    """
+    LangChain docstore that reads documents from a chunk store by chunk id.
+
+    Lets a FAISS vector store keep only vector positions and ids: texts stay
+    in the memory-mapped chunk store instead of a pickled in-memory copy.
+    Adding and deleting are no-ops because the chunking stage owns the texts.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def search(self, search):
+        if search not in self.store:
+            return f"ID {search} not found."
+        return to_document(self.store.get(search))
+
+    def add(self, texts):
+        pass
+
+    def delete(self, ids):
+        pass
@@ -1,8 +1,17 @@
 import os
-import json
 import logging
+from collections import deque
 from tqdm import tqdm
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+import telemetry
+from chunk_filter import REASONS, ChunkFilter, filter_signature
+from chunk_store import ChunkStore, ChunkStoreWriter, store_exists
+from lexical_index import LEXICAL_INDEX_DIR, build_lexical_index, lexical_index_exists
+from resources import EMBEDDING_DIMENSION, FAISS_INDEX_PATH, INDEX_FILE
+from manifest import (
+    load_manifest, save_manifest, hash_file, hash_text, make_chunk_id,
+    is_unchanged, prune_deleted
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -16,51 +25,252 @@ os.makedirs(CHUNKED_DATA_DIR, exist_ok=True)
 CHUNK_SIZE = 512
 CHUNK_OVERLAP = 50
 
+SEPARATORS = ["\n\n", "\n", ".", " ", ""]
+# Cleaned text has no newlines, so "." is the top-level separator
+SENTENCE_SEPARATOR = "."
+# Characters read from a processed file at a time when streaming
+READ_BLOCK_SIZE = 1 << 16
+
 # Initialize text splitter
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=CHUNK_SIZE,
     chunk_overlap=CHUNK_OVERLAP,
     length_function=len,
-    separators=["\n\n", "\n", ".", " ", ""]
+    separators=SEPARATORS
 )
 
-def chunk_text_file(input_path):
-    """Read and chunk text from a file."""
+# Splits single sentences that are too long to be one piece
+sentence_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+    separators=SEPARATORS[SEPARATORS.index(SENTENCE_SEPARATOR) + 1:]
+)
+
+def iter_text_file(input_path, block_size=READ_BLOCK_SIZE):
+    """Yield a text file in fixed-size blocks."""
     with open(input_path, "r", encoding="utf-8") as f:
-        text = f.read()
-    return text_splitter.split_text(text)
+        for block in iter(lambda: f.read(block_size), ""):
+            yield block
 
-def save_chunks_to_file(output_path, chunks):
-    """Save chunks into a file separated by newlines."""
-    with open(output_path, "w", encoding="utf-8") as f:
-        for chunk in chunks:
-            f.write(chunk + "\n\n")
+def iter_sentences(blocks):
+    """
+    Split streamed text on "." with the separator kept at the start of each
+    piece, exactly like the splitter's regex split. Only the current sentence
+    is buffered. Text without any "." comes out as a single piece, which the
+    sentence splitter then handles the same way `text_splitter` would.
+    """
+    buffer = ""
+    for block in blocks:
+        if "\n" in block:
+            raise ValueError("Streaming chunking expects cleaned text without newlines.")
+        buffer += block
+        start = 0
+        end = buffer.find(SENTENCE_SEPARATOR, 1)
+        while end != -1:
+            yield buffer[start:end]
+            start = end
+            end = buffer.find(SENTENCE_SEPARATOR, start + 1)
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
 
-def process_chunking():
-    """Main function to chunk all cleaned files and store metadata."""
-    chunk_metadata = {}
+def _join_chunk(pieces, start):
+    """Join merged pieces the way the splitter does, with the chunk's offset."""
+    joined = "".join(pieces)
+    chunk = joined.strip()
+    return chunk, start + len(joined) - len(joined.lstrip())
+
+def iter_chunk_spans(blocks):
+    """
+    Streaming equivalent of `text_splitter.split_text` for cleaned text.
 
-    for file in tqdm(os.listdir(PROCESSED_DATA_DIR), desc="Chunking files"):
-        if not file.endswith(".txt") or file == "processed_metadata.json":
+    Mirrors RecursiveCharacterTextSplitter's split/merge loop one sentence at a
+    time, keeping at most one chunk's worth of pieces in memory, so the chunks
+    match `text_splitter.split_text("".join(blocks))` one for one. Yields
+    (start, chunk) with the chunk's character offset in the streamed text.
+    """
+    current = deque()
+    current_start = 0
+    total = 0
+    position = 0
+    for piece in iter_sentences(blocks):
+        size = len(piece)
+        if size >= CHUNK_SIZE:
+            chunk, start = _join_chunk(current, current_start)
+            if chunk:
+                yield start, chunk
+            current.clear()
+            total = 0
+            search_from = 0
+            for chunk in sentence_splitter.split_text(piece):
+                search_from = piece.find(chunk, search_from)
+                yield position + search_from, chunk
+            position += size
+            current_start = position
             continue
 
-        input_path = os.path.join(PROCESSED_DATA_DIR, file)
-        output_path = os.path.join(CHUNKED_DATA_DIR, file)
+        if total + size > CHUNK_SIZE and current:
+            chunk, start = _join_chunk(current, current_start)
+            if chunk:
+                yield start, chunk
+            while total > CHUNK_OVERLAP or (total + size > CHUNK_SIZE and total > 0):
+                dropped = len(current.popleft())
+                total -= dropped
+                current_start += dropped
+        if not current:
+            current_start = position
+        current.append(piece)
+        total += size
+        position += size
 
-        try:
-            chunks = chunk_text_file(input_path)
-            save_chunks_to_file(output_path, chunks)
-            chunk_metadata[file] = len(chunks)
-        except Exception as e:
-            logging.error(f"Error processing {file}: {e}")
+    chunk, start = _join_chunk(current, current_start)
+    if chunk:
+        yield start, chunk
+
+def iter_chunks(blocks):
+    """Like `iter_chunk_spans` but yields only the chunk texts."""
+    for _, chunk in iter_chunk_spans(blocks):
+        yield chunk
+
+def chunk_text_file(input_path):
+    """Stream and chunk text from a file, yielding chunks as they are produced."""
+    return iter_chunks(iter_text_file(input_path))
+
+def save_source_chunks(writer, source, input_path):
+    """
+    Chunk one processed file into the store writer, leaving out junk and
+    duplicate chunks. Returns the hashes of the chunks kept and the filter
+    stats. Ids are assigned before filtering, so dropping a chunk never
+    changes the ids of the others.
+    """
+    chunk_hashes = []
+    seen = {}
+    chunk_filter = ChunkFilter()
+    for start, chunk in iter_chunk_spans(iter_text_file(input_path)):
+        chunk_hash = hash_text(chunk)
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        if chunk_filter.check(chunk):
             continue
+        chunk_id = make_chunk_id(source, chunk_hash, occurrence)
+        writer.add(chunk_id, chunk, source, start, start + len(chunk))
+        chunk_hashes.append(chunk_hash)
+    return chunk_hashes, chunk_filter.stats()
+
+def index_dimension(path=FAISS_INDEX_PATH):
+    """Vector dimension of the saved index (of a shard if sharded), else the model's."""
+    import faiss
+    from index_shards import SHARDS_DIR, load_shard_table
+    index_files = [os.path.join(path, INDEX_FILE)] + [
+        os.path.join(path, SHARDS_DIR, name, INDEX_FILE) for name in load_shard_table(path).values()
+    ]
+    for index_file in index_files:
+        if os.path.exists(index_file):
+            return faiss.read_index(index_file, faiss.IO_FLAG_MMAP).d
+    return EMBEDDING_DIMENSION
+
+def log_filter_stats(filtered):
+    """
+    Log how many chunks the chunk filter dropped in this run, with the bytes
+    of chunk text and of flat-index vectors (float32, one per chunk) saved.
+    """
+    kept = sum(stats["kept"] for stats in filtered.values())
+    dropped = {reason: sum(stats[reason] for stats in filtered.values()) for reason in REASONS}
+    total = kept + sum(dropped.values())
+    if not total:
+        return
+    text_bytes = sum(stats["bytes"] for stats in filtered.values())
+    vector_bytes = (total - kept) * index_dimension() * 4 if total > kept else 0
+    logging.info(
+        f"Chunk filter dropped {total - kept} of {total} chunks "
+        f"({', '.join(f'{count} {reason}' for reason, count in dropped.items())}), "
+        f"{text_bytes / 1024:.1f} KB of chunk text and {vector_bytes / 1024:.1f} KB of index vectors."
+    )
+    telemetry.count("index_bytes_saved", vector_bytes)
+
+@telemetry.traced("lexical_index")
+def update_lexical_index(store):
+    """Rebuild the BM25 index from the whole chunk store."""
+    terms = build_lexical_index(store, LEXICAL_INDEX_DIR)
+    logging.info(f"Lexical index: {len(store)} chunks, {terms} terms in '{LEXICAL_INDEX_DIR}/'.")
+
+@telemetry.traced("chunking")
+def process_chunking():
+    """Chunk new or changed cleaned files into the chunk store and manifest."""
+    manifest = load_manifest()
+    stage = manifest["chunking"]
+    processed_files = sorted(
+        file for file in os.listdir(PROCESSED_DATA_DIR) if file.endswith(".txt")
+    )
+    old_store = ChunkStore(CHUNKED_DATA_DIR) if store_exists(CHUNKED_DATA_DIR) else None
+    old_sources = set(old_store.sources) if old_store is not None else set()
+
+    # Files chunked under other filter settings are chunked again
+    signature = filter_signature()
+    digests = {}
+    pending = []
+    for file in processed_files:
+        digests[file] = hash_file(os.path.join(PROCESSED_DATA_DIR, file))
+        unchanged = (
+            is_unchanged(manifest, "chunking", file, digests[file])
+            and stage[file].get("filter") == signature
+        )
+        # A file whose chunks were all filtered out has none in the store
+        if not (unchanged and (file in old_sources or not stage[file].get("chunks"))):
+            pending.append(file)
+
+    # Chunks of processed files that were deleted are simply not copied over
+    for file in prune_deleted(manifest, "chunking", set(processed_files)):
+        logging.info(f"Removed chunks of deleted file: {file}")
+
+    if old_store is not None and not pending and old_sources <= set(processed_files):
+        if not lexical_index_exists(LEXICAL_INDEX_DIR):
+            update_lexical_index(old_store)
+        old_store.close()
+        save_manifest(manifest)
+        logging.info(f"Chunk store is up to date ({len(processed_files)} unchanged file(s)).")
+        return
+
+    filtered = {}
+    with telemetry.span("chunk", files=len(pending)), ChunkStoreWriter(CHUNKED_DATA_DIR) as writer:
+        for file in tqdm(processed_files, desc="Chunking files"):
+            if file not in pending:
+                if file in old_sources:
+                    writer.copy_source(old_store, file)
+                continue
+
+            input_path = os.path.join(PROCESSED_DATA_DIR, file)
+            try:
+                chunk_hashes, filtered[file] = save_source_chunks(writer, file, input_path)
+                stage[file] = {
+                    "hash": digests[file], "chunks": chunk_hashes,
+                    "filter": signature, "filtered": filtered[file]
+                }
+            except Exception as e:
+                logging.error(f"Error processing {file}: {e}")
+                # Keep the previous chunks of a file that failed to re-chunk
+                writer.discard_source(file)
+                if file in old_sources:
+                    writer.copy_source(old_store, file)
+                continue
+
+        # Release the old files before the new store replaces them
+        if old_store is not None:
+            old_store.close()
 
-    # Save metadata
-    metadata_path = os.path.join(CHUNKED_DATA_DIR, "chunk_metadata.json")
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(chunk_metadata, f, indent=4)
+    new_store = ChunkStore(CHUNKED_DATA_DIR)
+    update_lexical_index(new_store)
+    new_store.close()
+    save_manifest(manifest)
 
-    logging.info("Chunking completed. Chunks saved in 'data/chunks/'.")
+    log_filter_stats(filtered)
+    telemetry.count("files_skipped", len(processed_files) - len(pending))
+    for stats in filtered.values():
+        telemetry.count("chunks", stats["kept"])
+        telemetry.count("chunks_dropped", sum(stats[reason] for reason in REASONS))
+    logging.info(f"Skipped {len(processed_files) - len(pending)} unchanged file(s).")
+    logging.info("Chunking completed. Chunks saved in the 'data/chunks/' store.")
 
 if __name__ == "__main__":
     process_chunking()
@@ -0,0 +1,169 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import namedtuple
+from langchain_core.documents import Document
+import telemetry
+from chunk_filter import DOT_LEADER
+from resources import get_chunk_store
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+
+# Prompt-context budget in tokens per doc_type; CONTEXT_TOKEN_BUDGET
+# overrides all of them
+CONTEXT_TOKEN_BUDGETS = {"report": 1500, "sop": 1500, "summary": 2000, "default": 1000}
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+
+# Rough English average for Mistral's tokenizer, which is not bundled
+CHARS_PER_TOKEN = 4
+# Chunks of one source at most this many characters apart are merged
+MERGE_GAP = 1
+# Passages sharing this fraction of word 3-grams with a kept one are dropped
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Smallest remainder of the budget worth filling with a truncated passage
+MIN_PARTIAL_TOKENS = 64
+
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+PackedContext = namedtuple("PackedContext", ["documents", "tokens_before", "tokens_after"])
+
+def estimate_tokens(text):
+    """Approximate token count of a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def token_budget(doc_type):
+    """Context token budget for a doc_type."""
+    if CONTEXT_TOKEN_BUDGET:
+        return CONTEXT_TOKEN_BUDGET
+    return CONTEXT_TOKEN_BUDGETS.get(doc_type.lower(), CONTEXT_TOKEN_BUDGETS["default"])
+
+def strip_dot_leaders(text):
+    """Replace TOC dot leaders (and their page numbers) with a single space."""
+    return " ".join(DOT_LEADER.sub(" ", text).split())
+
+def _shingles(text, size=3):
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def _similarity(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def merge_chunks(documents, chunk_store):
+    """
+    Merge retrieved chunks that overlap or touch in the same source.
+
+    Returns passages as (rank, source, chunk ids, text), ordered by the best
+    retrieval rank among their chunks; the best-ranked chunk id comes first.
+    Chunks missing from the store are kept as they are.
+    """
+    spans = {}
+    passages = []
+    for rank, doc in enumerate(documents):
+        chunk_id = doc.metadata.get("chunk_id")
+        source = doc.metadata.get("source")
+        if chunk_id in chunk_store:
+            chunk = chunk_store.get(chunk_id)
+            spans.setdefault(source, []).append((chunk.start, chunk.end, rank, chunk_id, doc.page_content))
+        else:
+            passages.append((rank, source, [chunk_id], doc.page_content))
+
+    for source, source_spans in spans.items():
+        source_spans.sort()
+        passage = None
+        for start, end, rank, chunk_id, text in source_spans:
+            if passage is None or start > passage["end"] + MERGE_GAP:
+                if passage is not None:
+                    passages.append((passage["rank"], source, passage["ids"], passage["text"]))
+                passage = {"end": end, "rank": rank, "ids": [chunk_id], "text": text}
+                continue
+            if end > passage["end"]:
+                # Overlapping text is kept once; a one-character gap is a space
+                if start <= passage["end"]:
+                    passage["text"] += text[passage["end"] - start:]
+                else:
+                    passage["text"] += " " + text
+                passage["end"] = end
+            # Best-ranked chunk first, so it names the passage
+            if rank < passage["rank"]:
+                passage["rank"] = rank
+                passage["ids"].insert(0, chunk_id)
+            else:
+                passage["ids"].append(chunk_id)
+        passages.append((passage["rank"], source, passage["ids"], passage["text"]))
+
+    return sorted(passages, key=lambda passage: passage[0])
+
+def _truncate(text, max_chars):
+    """Cut text to at most `max_chars`, at a sentence end when there is one."""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    ends = [match.end() for match in SENTENCE_END.finditer(head + " ")]
+    return head[:ends[-1]].rstrip() if ends else head.rstrip()
+
+# Totals across requests, for reporting tokens saved
+_context_totals = {"requests": 0, "tokens_before": 0, "tokens_after": 0}
+_stats_lock = threading.Lock()
+
+def context_stats():
+    """Requests packed and prompt tokens before and after packing, with the tokens saved."""
+    with _stats_lock:
+        totals = dict(_context_totals)
+    return {**totals, "tokens_saved": totals["tokens_before"] - totals["tokens_after"]}
+
+@telemetry.traced("build_context")
+def build_context(documents, doc_type="default", budget=None):
+    """
+    Turn retrieved documents (best first) into compact prompt context.
+
+    Overlapping and adjacent chunks of a source are merged, dot leaders are
+    stripped, near-duplicate passages are dropped, and passages are packed
+    best first into the doc_type's token budget (the last one truncated at
+    a sentence end if worthwhile).
+
+    Returns:
+        PackedContext: the passages as documents (metadata: source,
+        chunk_id of the best chunk, chunk_ids), and the estimated context
+        tokens before and after packing.
+    """
+    budget = budget or token_budget(doc_type)
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in documents)
+
+    packed = []
+    kept_shingles = []
+    remaining = budget
+    for rank, source, chunk_ids, text in merge_chunks(documents, get_chunk_store()):
+        text = strip_dot_leaders(text)
+        shingles = _shingles(text)
+        if not text or any(_similarity(shingles, kept) >= NEAR_DUPLICATE_THRESHOLD for kept in kept_shingles):
+            continue
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                continue  # a shorter passage further down may still fit
+            text = _truncate(text, remaining * CHARS_PER_TOKEN)
+            tokens = estimate_tokens(text)
+        packed.append(Document(
+            page_content=text,
+            metadata={"source": source, "chunk_id": chunk_ids[0], "chunk_ids": chunk_ids}
+        ))
+        kept_shingles.append(shingles)
+        remaining -= tokens
+        if remaining <= 0:
+            break
+
+    tokens_after = sum(estimate_tokens(doc.page_content) for doc in packed)
+    telemetry.count("context_tokens_before", tokens_before)
+    telemetry.count("context_tokens_after", tokens_after)
+    with _stats_lock:
+        _context_totals["requests"] += 1
+        _context_totals["tokens_before"] += tokens_before
+        _context_totals["tokens_after"] += tokens_after
+    logging.debug(
+        f"Context for {doc_type}: {len(documents)} chunks -> {len(packed)} passages, "
+        f"~{tokens_before} -> ~{tokens_after} tokens (budget {budget})."
+    )
+    return PackedContext(packed, tokens_before, tokens_after)
@@ -1,9 +1,16 @@
 import os
 import re
-import json
+import time
 import logging
+import argparse
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import pypdf
 from tqdm import tqdm
+import telemetry
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from manifest import load_manifest, save_manifest, hash_file, is_unchanged, prune_deleted
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +22,12 @@ PROCESSED_DATA_DIR = "data/processed"
 # Ensure output directory exists
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
 
+# Parallel extraction: 1 keeps the serial path, 0 uses every CPU core
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "1"))
+# PDFs with more pages than this are split into page ranges across workers
+LARGE_PDF_PAGES = 100
+PDF_PAGE_RANGE = 50
+
 # File extension to loader mapping
 LOADERS = {
     ".pdf": PyPDFLoader,
@@ -22,49 +35,258 @@ LOADERS = {
     ".txt": lambda path: TextLoader(path, encoding="utf-8")
 }
 
+UNWANTED_CHARS = re.compile(r'[^a-zA-Z0-9.,!? ]+')
+WHITESPACE = re.compile(r'\s+')
+
 def clean_text(text):
     """Clean extracted text by removing unwanted characters and formatting."""
-    return re.sub(r'\s+', ' ', re.sub(r'[^a-zA-Z0-9.,!? ]+', '', text)).strip()
+    return WHITESPACE.sub(' ', UNWANTED_CHARS.sub('', text)).strip()
+
+def iter_clean_text(pieces):
+    """
+    Streaming equivalent of `clean_text` over consecutive pieces of one text.
+
+    Character removal is local, so only the whitespace collapse and the final
+    strip need state across piece boundaries: a pending space is emitted only
+    once more text follows it. "".join(output) == clean_text("".join(pieces)).
+    """
+    started = False
+    pending_space = False
+    for piece in pieces:
+        piece = UNWANTED_CHARS.sub('', piece)
+        if not piece:
+            continue
+        core = WHITESPACE.sub(' ', piece).strip()
+        if not core:
+            pending_space = started
+            continue
+        if started and (pending_space or piece[0] == ' '):
+            yield ' '
+        yield core
+        started = True
+        pending_space = piece[-1] == ' '
 
 def save_text_file(path, content):
     """Save cleaned content to a file."""
     with open(path, "w", encoding="utf-8") as f:
         f.write(content)
 
-def process_documents():
-    """Process raw telecom documents using LangChain loaders and save cleaned text."""
-    processed_data = {}
+def save_text_stream(path, pieces):
+    """Write streamed text to a temporary file, then move it into place."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for piece in pieces:
+                f.write(piece)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def extract_pdf_page(page):
+    """Extract one pypdf page the same way PyPDFLoader does."""
+    return page.extract_text(extraction_mode="plain").strip()
+
+def iter_pages(file_path):
+    """Yield page texts one at a time so a large document is never held whole."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == ".pdf":
+        for page in pypdf.PdfReader(file_path).pages:
+            yield extract_pdf_page(page)
+    else:
+        for doc in LOADERS[file_ext](file_path).lazy_load():
+            yield doc.page_content
+
+def iter_document_text(pages, stats):
+    """Join page texts with single spaces, counting pages and characters in `stats`."""
+    for page in pages:
+        if stats["pages"]:
+            stats["chars"] += 1
+            yield " "
+        stats["pages"] += 1
+        stats["chars"] += len(page)
+        yield page
+
+def extract_pages(file_path):
+    """Load a whole file with its LangChain loader and return the page texts."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    loader = LOADERS[file_ext](file_path)
+    return [doc.page_content for doc in loader.load()]
+
+def extract_pdf_page_range(file_path, start, end):
+    """Extract pages [start, end) of a PDF the same way PyPDFLoader does."""
+    reader = pypdf.PdfReader(file_path)
+    return [extract_pdf_page(reader.pages[i]) for i in range(start, end)]
+
+def count_pdf_pages(file_path):
+    """Return the number of pages in a PDF without extracting any text."""
+    return len(pypdf.PdfReader(file_path).pages)
 
-    for file in tqdm(os.listdir(RAW_DATA_DIR), desc="Processing files"):
+def file_tasks(file_path):
+    """
+    Extraction tasks of one file as (first page, function, args): one for
+    the whole file, or one per page range of a large PDF.
+    """
+    num_pages = count_pdf_pages(file_path) if file_path.lower().endswith(".pdf") else 0
+    if num_pages <= LARGE_PDF_PAGES:
+        return [(0, extract_pages, (file_path,))]
+    return [
+        (start, extract_pdf_page_range, (file_path, start, min(start + PDF_PAGE_RANGE, num_pages)))
+        for start in range(0, num_pages, PDF_PAGE_RANGE)
+    ]
+
+def extract_in_parallel(file_paths, workers):
+    """
+    Extract page texts for many files with a process pool, yielding
+    (file path, page texts or the raised exception) as each file finishes.
+
+    Small files are one task each; large PDFs are split into page ranges,
+    reassembled in page order so the pages match `extract_pages`. At most
+    two tasks per worker are queued, and a file is handed over as soon as
+    its last range is done, so only the files in progress are held in memory.
+    """
+    workers = workers or os.cpu_count() or 1
+    files = iter(file_paths)
+    queued = deque()    # (file path, first page, function, args) not yet submitted
+    running = {}        # future -> (file path, first page)
+    remaining = {}      # file path -> tasks not finished
+    parts = {}          # file path -> finished (first page, pages), or the exception
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(running) < 2 * workers:
+                if not queued:
+                    file_path = next(files, None)
+                    if file_path is None:
+                        break
+                    try:
+                        tasks = file_tasks(file_path)
+                    except Exception as e:
+                        yield file_path, e
+                        continue
+                    remaining[file_path] = len(tasks)
+                    parts[file_path] = []
+                    queued.extend((file_path, *task) for task in tasks)
+                    continue
+                file_path, start, function, args = queued.popleft()
+                running[executor.submit(function, *args)] = (file_path, start)
+            if not running:
+                return
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, start = running.pop(future)
+                try:
+                    if not isinstance(parts[file_path], Exception):
+                        parts[file_path].append((start, future.result()))
+                except Exception as e:
+                    parts[file_path] = e
+                remaining[file_path] -= 1
+                if remaining[file_path]:
+                    continue
+                del remaining[file_path]
+                ranges = parts.pop(file_path)
+                if isinstance(ranges, Exception):
+                    yield file_path, ranges
+                else:
+                    ranges.sort(key=lambda part: part[0])
+                    yield file_path, [page for _, pages in ranges for page in pages]
+
+@telemetry.traced("preprocess")
+def process_documents(workers=EXTRACTION_WORKERS):
+    """Process new or changed raw telecom documents and save cleaned text."""
+    manifest = load_manifest()
+    stage = manifest["preprocess"]
+    raw_files = sorted(os.listdir(RAW_DATA_DIR))
+    skipped = 0
+    pending = {}  # file path -> (file, processed file path, digest)
+
+    for file in raw_files:
         file_path = os.path.join(RAW_DATA_DIR, file)
         file_name, file_ext = os.path.splitext(file)
         file_ext = file_ext.lower()
 
-        loader_class = LOADERS.get(file_ext)
-        if not loader_class:
+        if not LOADERS.get(file_ext):
             logging.warning(f"Skipping unsupported file type: {file}")
             continue
 
-        try:
-            loader = loader_class(file_path)
-            documents = loader.load()
-            text = " ".join(doc.page_content for doc in documents)
-        except Exception as e:
-            logging.error(f"Error loading {file}: {e}")
+        output_name = f"{file_name}.txt"
+        processed_file_path = os.path.join(PROCESSED_DATA_DIR, output_name)
+        digest = hash_file(file_path)
+        # A file that extracted to no text is recorded without an output
+        has_output = stage.get(file, {}).get("output") is not None
+        output_path = processed_file_path if has_output else None
+        if is_unchanged(manifest, "preprocess", file, digest, output_path):
+            skipped += 1
             continue
+        pending[file_path] = (file, processed_file_path, digest)
 
-        if text:
-            cleaned_text = clean_text(text)
-            processed_file_path = os.path.join(PROCESSED_DATA_DIR, f"{file_name}.txt")
-            save_text_file(processed_file_path, cleaned_text)
-            processed_data[file] = processed_file_path
+    start_time = time.perf_counter()
+    if workers == 1:
+        # Pages stream from the loader through cleaning straight to disk
+        documents = ((file_path, iter_pages(file_path)) for file_path in pending)
+        extraction = nullcontext()
+    else:
+        # Each file is written as soon as the pool has extracted it
+        documents = extract_in_parallel(list(pending), workers)
+        extraction = telemetry.span("extract_parallel", workers=workers)
+
+    total_pages = 0
+    total_bytes = 0
+    with extraction:
+        for file_path, pages in tqdm(documents, total=len(pending), desc="Processing files"):
+            file, processed_file_path, digest = pending[file_path]
+            stats = {"pages": 0, "chars": 0}
+            try:
+                if isinstance(pages, Exception):
+                    raise pages
+                with telemetry.span("extract_and_clean", file=file):
+                    save_text_stream(
+                        processed_file_path, iter_clean_text(iter_document_text(pages, stats))
+                    )
+            except Exception as e:
+                logging.error(f"Error loading {file}: {e}")
+                continue
+
+            total_pages += stats["pages"]
+            total_bytes += os.path.getsize(file_path)
+
+            if stats["chars"]:
+                stage[file] = {"hash": digest, "output": os.path.basename(processed_file_path)}
+            else:
+                os.remove(processed_file_path)
+                stage[file] = {"hash": digest, "output": None}
+    elapsed = time.perf_counter() - start_time
+    telemetry.count("files_processed", len(pending))
+    telemetry.count("files_skipped", skipped)
+    telemetry.count("pages", total_pages)
+    telemetry.count("raw_bytes", total_bytes)
+
+    # Remove outputs of raw files that were deleted since the last run
+    for file, record in prune_deleted(manifest, "preprocess", set(raw_files)).items():
+        if record["output"] is None:
+            continue
+        stale_path = os.path.join(PROCESSED_DATA_DIR, record["output"])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        logging.info(f"Removed processed output of deleted file: {file}")
 
-    # Save metadata JSON
-    metadata_path = os.path.join(PROCESSED_DATA_DIR, "processed_metadata.json")
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(processed_data, f, indent=4)
+    save_manifest(manifest)
 
+    if elapsed > 0 and total_pages:
+        logging.info(
+            f"Extracted {total_pages} pages ({total_bytes / 1e6:.1f} MB) in {elapsed:.2f}s: "
+            f"{total_pages / elapsed:.1f} pages/sec, {total_bytes / 1e6 / elapsed:.2f} MB/sec "
+            f"(workers={workers or os.cpu_count()})."
+        )
+    logging.info(f"Skipped {skipped} unchanged file(s).")
     logging.info("Data preprocessing completed. Processed files saved in 'data/processed'.")
 
 if __name__ == "__main__":
-    process_documents()
+    parser = argparse.ArgumentParser(description="Preprocess raw telecom documents.")
+    parser.add_argument(
+        "--workers", type=int, default=EXTRACTION_WORKERS,
+        help="Extraction processes (1 = serial, 0 = one per CPU core)."
+    )
+    args = parser.parse_args()
+    process_documents(workers=args.workers)
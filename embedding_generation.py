@@ -1,71 +1,552 @@
 import os
-import json
+import math
+import time
+import argparse
+from array import array
 from tqdm import tqdm
+import telemetry
+from langchain.storage import LocalFileStore
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
+from chunk_store import ChunkStore, ChunkStoreDocstore, store_exists
+from resources import (
+    FAISS_INDEX_PATH, INDEX_FILE, INDEX_IDS_FILE, LEGACY_DOCSTORE_FILE,
+    EMBEDDING_BACKENDS, VECTORSTORE_DIR, embedding_model_id, get_embedding_model,
+    indexed_embedding_model, is_legacy_index, load_index_config, load_vector_store, save_index_config,
+    save_vector_store, set_embedding_backend
+)
+from query_gate import TOPIC_CENTROIDS_FILE, compute_topic_centroids
+from index_shards import (
+    SHARDS_DIR, is_sharded_index, load_shard_table, remove_shards, remove_unused_shards,
+    save_shard_table, shard_dir_name
+)
+from manifest import load_manifest, save_manifest, hash_text, is_unchanged, prune_deleted
 
 # Define paths
 CHUNKED_DATA_DIR = "data/chunks"
-VECTORSTORE_DIR = "vectorstore"
-FAISS_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "faiss_index")
+EMBEDDING_CACHE_DIR = os.path.join(VECTORSTORE_DIR, "embedding_cache")
 os.makedirs(VECTORSTORE_DIR, exist_ok=True)
 
-# Load embedding model
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Embedding configuration
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Encoding processes on CPU; 1 encodes in this process. Only the torch
+# backend uses processes; onnxruntime spreads each batch over ONNX_THREADS
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
 
-def load_chunks_from_file(file_path, file_name):
-    """Read a chunk file and return clean documents."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+# Vectors keyed by (model id, chunk text hash), reused across runs
+embedding_cache = LocalFileStore(EMBEDDING_CACHE_DIR)
 
-    raw_chunks = content.split("\n\n")
-    documents = []
+def embedding_cache_key(text):
+    """Cache key for a chunk's vector under the current model."""
+    return f"{embedding_model_id()}/{hash_text(text)}"
 
-    for chunk in raw_chunks:
-        chunk = chunk.strip()
-        if chunk:
-            documents.append(
-                Document(page_content=chunk, metadata={"source": file_name})
+def encode_texts(texts, pool=None):
+    """Encode one batch, in-process or on a sentence-transformers process pool."""
+    embedding_model = get_embedding_model()
+    if pool is None:
+        return embedding_model.embed_documents(texts)
+    # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+    texts = [text.replace("\n", " ") for text in texts]
+    vectors = embedding_model.client.encode_multi_process(
+        texts, pool, batch_size=EMBEDDING_BATCH_SIZE, **embedding_model.encode_kwargs
+    )
+    return vectors.tolist()
+
+@telemetry.traced("embed_documents")
+def embed_documents(documents, batch_size=EMBEDDING_BATCH_SIZE, workers=EMBEDDING_WORKERS):
+    """
+    Embed documents batch by batch, reading and filling the on-disk cache.
+
+    Returns the unit-length vectors in document order and the number served
+    from cache.
+    """
+    vectors = []
+    cache_hits = 0
+    encoded = 0
+    pool = None
+    start_time = time.perf_counter()
+
+    try:
+        for start in tqdm(range(0, len(documents), batch_size), desc="Embedding batches"):
+            texts = [doc.page_content for doc in documents[start:start + batch_size]]
+            keys = [embedding_cache_key(text) for text in texts]
+            batch = [
+                array("f", cached).tolist() if cached is not None else None
+                for cached in embedding_cache.mget(keys)
+            ]
+
+            missing = [i for i, vector in enumerate(batch) if vector is None]
+            cache_hits += len(texts) - len(missing)
+            if missing:
+                if workers > 1 and pool is None and hasattr(get_embedding_model(), "client"):
+                    pool = get_embedding_model().client.start_multi_process_pool(["cpu"] * workers)
+                new_vectors = encode_texts([texts[i] for i in missing], pool)
+                embedding_cache.mset([
+                    (keys[i], array("f", vector).tobytes())
+                    for i, vector in zip(missing, new_vectors)
+                ])
+                for i, vector in zip(missing, new_vectors):
+                    batch[i] = vector
+                encoded += len(missing)
+
+            vectors.extend(batch)
+    finally:
+        if pool is not None:
+            get_embedding_model().client.stop_multi_process_pool(pool)
+
+    elapsed = time.perf_counter() - start_time
+    telemetry.count("chunks_embedded", encoded)
+    telemetry.count("embedding_cache_hits", cache_hits)
+    if documents and elapsed > 0:
+        print(
+            f"⚡ {len(documents)} chunks in {elapsed:.2f}s ({len(documents) / elapsed:.1f} chunks/sec): "
+            f"{encoded} encoded, {cache_hits} from cache."
+        )
+    if vectors:
+        vectors = np.array(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        vectors = vectors.tolist()
+    return vectors, cache_hits
+
+# Cosine similarity: unit-length vectors in an inner-product index. Vectors
+# are normalised here rather than by LangChain, which only does so for L2.
+INDEX_CONFIG = {"metric": "ip", "normalize_L2": False}
+
+# Index type built by process_embeddings: exact "flat", or approximate
+# "ivf" (trained centroids) and "hnsw" (graph) for large corpora
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(number of vectors)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+# One index per source file instead of one for the whole corpus, so a
+# changed file only rebuilds its own shard and searches can skip sources
+SHARDED_INDEX = os.getenv("SHARDED_INDEX", "0") == "1"
+
+def legacy_chunk_ids(vector_store, chunk_store):
+    """
+    Chunk ids for the vectors of a pickled-docstore index, in index order.
+
+    Old indexes used random ids; each document is matched to the chunk store
+    chunk with the same source and text. Raises ValueError if one is missing.
+    """
+    chunk_ids = {}
+    for source in chunk_store.sources:
+        for chunk in chunk_store.iter_source(source):
+            chunk_ids.setdefault((source, chunk.text), []).append(chunk.id)
+
+    ids = []
+    for position in range(vector_store.index.ntotal):
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        matches = chunk_ids.get((doc.metadata.get("source"), doc.page_content))
+        if not matches:
+            raise ValueError(
+                f"Indexed text from {doc.metadata.get('source')} is not in the chunk store; "
+                "rebuild the index with --rebuild instead."
             )
+        ids.append(matches.pop(0))
+    return ids
+
+def migrate_index(path=FAISS_INDEX_PATH):
+    """
+    Convert a legacy index in place to the current format, without re-embedding.
+
+    A pickled docstore is replaced by chunk ids into the chunk store, and a
+    raw-L2 index is normalised and copied into a flat inner-product (cosine)
+    index. Returns True if the index was migrated.
+    """
+    legacy_docstore = is_legacy_index(path)
+    config = load_index_config(path)
+    if config["metric"] == "ip" and not legacy_docstore:
+        return False
+
+    chunk_store = ChunkStore(CHUNKED_DATA_DIR)
+    vector_store = load_vector_store(path, chunk_store=chunk_store, mmap=False)
+    if legacy_docstore:
+        ids = legacy_chunk_ids(vector_store, chunk_store)
+        vector_store.index_to_docstore_id = dict(enumerate(ids))
+        print(f"✅ Moved {len(ids)} documents in {path} from index.pkl to the chunk store.")
+
+    if config["metric"] != "ip":
+        vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        vector_store.index = index
+        config = {**INDEX_CONFIG, "index_type": "flat", "embedding_model": indexed_embedding_model(config)}
+        print(f"✅ Migrated {index.ntotal} vectors in {path} to a cosine (inner-product) index.")
+
+    # The vectors are kept, so they stay those of the model that built the index
+    config = {**config, "embedding_model": indexed_embedding_model(config)}
+    centroids = index_topic_centroids(vector_store.index)
+    save_vector_store(vector_store, path)
+    save_index_config(config, path)
+    save_topic_centroids(centroids, path)
+    chunk_store.close()
+    return True
+
+# Vectors sampled from the index to cluster into topic centroids
+TOPIC_SAMPLE_SIZE = 8192
+
+def sample_index_vectors(index, size, seed=0):
+    """Up to `size` vectors picked at random from a FAISS index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    positions = np.arange(index.ntotal, dtype=np.int64)
+    if index.ntotal > size:
+        positions = np.sort(np.random.default_rng(seed).choice(positions, size, replace=False))
+    return index.reconstruct_batch(positions)
+
+def index_topic_centroids(index):
+    """
+    Cluster the indexed vectors into the topic centroids used by the query gate
+    (None for an empty index).
+
+    `index` may be a list of shard indexes, sampled in proportion to their size.
+    """
+    indexes = index if isinstance(index, list) else [index]
+    total = sum(shard.ntotal for shard in indexes)
+    if total == 0:
+        return None
+    vectors = np.concatenate([
+        sample_index_vectors(shard, max(1, TOPIC_SAMPLE_SIZE * shard.ntotal // total))
+        for shard in indexes if shard.ntotal
+    ])
+    return compute_topic_centroids(vectors)
+
+def save_topic_centroids(centroids, path=FAISS_INDEX_PATH):
+    if centroids is not None:
+        np.save(os.path.join(path, TOPIC_CENTROIDS_FILE), centroids)
+
+def load_source_documents(store, source, chunk_ids):
+    """Read the given chunks of one source from the store as documents."""
+    return [
+        Document(
+            page_content=chunk.text,
+            metadata={"source": source, "chunk_id": chunk.id}
+        )
+        for chunk in store.get_many(chunk_ids)
+    ]
+
+def create_faiss_index(vectors, index_type=INDEX_TYPE):
+    """
+    Create an empty (but trained) inner-product index of the given type.
+
+    Returns the index and the build/search parameters to persist with it.
+    Default search knobs (nprobe, efSearch) are set on the index itself, so
+    faiss saves them along with it.
+    """
+    num_vectors, dim = vectors.shape
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim), {}
+
+    if index_type == "ivf":
+        nlist = IVF_NLIST or int(4 * math.sqrt(num_vectors))
+        # faiss wants roughly 39 training points per centroid
+        nlist = max(1, min(nlist, num_vectors // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index, {"nlist": nlist, "nprobe": index.nprobe}
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index, {
+            "M": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH
+        }
 
-    return documents
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
 
-def process_embeddings():
-    """Generate vector embeddings from chunked files and store in FAISS."""
-    all_documents = []
-    metadata_info = {}
+def build_vector_store(documents, vectors, ids, chunk_store, index_type=INDEX_TYPE):
+    """Build a FAISS store of `index_type` from precomputed vectors; return it and its config."""
+    matrix = np.array(vectors, dtype=np.float32)
+    index, params = create_faiss_index(matrix, index_type)
+    vector_store = FAISS(
+        get_embedding_model(),
+        index,
+        ChunkStoreDocstore(chunk_store),
+        {},
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+        normalize_L2=INDEX_CONFIG["normalize_L2"]
+    )
+    vector_store.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors),
+        metadatas=[doc.metadata for doc in documents],
+        ids=ids
+    )
+    return vector_store, {
+        **INDEX_CONFIG, "index_type": index_type, "embedding_model": embedding_model_id(), **params
+    }
 
-    for file in tqdm(os.listdir(CHUNKED_DATA_DIR), desc="Generating embeddings"):
-        file_path = os.path.join(CHUNKED_DATA_DIR, file)
+def update_shards(chunk_store, sources, batch_size, workers, index_type, path=FAISS_INDEX_PATH):
+    """
+    Rebuild the shards of `sources` and drop those of files no longer chunked.
 
-        if not file.endswith(".txt") or file == "chunk_metadata.json":
+    Each shard is built from scratch from its (mostly cached) vectors and
+    written to its own directory; the other shards are not touched. The
+    shard table is written last, so readers switch to the new shards at once.
+    Returns the shard table and the number of vectors written.
+    """
+    table = {
+        source: name for source, name in load_shard_table(path).items()
+        if source in chunk_store.sources
+    }
+    documents = {
+        source: load_source_documents(chunk_store, source, chunk_store.source_ids(source))
+        for source in sources
+    }
+    # One embedding pass over every changed source, split per shard afterwards
+    all_documents = [doc for source in sources for doc in documents[source]]
+    vectors, _ = embed_documents(all_documents, batch_size, workers) if all_documents else ([], 0)
+
+    start = 0
+    for source in sources:
+        source_documents = documents[source]
+        source_vectors = vectors[start:start + len(source_documents)]
+        start += len(source_documents)
+        if not source_documents:
+            table.pop(source, None)
             continue
+        name = shard_dir_name(source)
+        shard_path = os.path.join(path, SHARDS_DIR, name)
+        vector_store, config = build_vector_store(
+            source_documents, source_vectors,
+            [doc.metadata["chunk_id"] for doc in source_documents], chunk_store, index_type
+        )
+        save_vector_store(vector_store, shard_path)
+        save_index_config(config, shard_path)
+        table[source] = name
+
+    save_shard_table(table, path)
+    remove_unused_shards(table, path)
+    return table, len(all_documents)
+
+def _remove_single_index(path=FAISS_INDEX_PATH):
+    """Remove the files of a single (unsharded) index from `path`."""
+    for name in (INDEX_FILE, INDEX_IDS_FILE, LEGACY_DOCSTORE_FILE):
+        if os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+
+@telemetry.traced("embedding")
+def process_embeddings(
+    batch_size=EMBEDDING_BATCH_SIZE, workers=EMBEDDING_WORKERS, index_type=INDEX_TYPE, rebuild=False,
+    sharded=SHARDED_INDEX
+):
+    """
+    Embed new or changed chunks and update the FAISS store in place.
+
+    With `sharded`, the index is kept as one shard per source file and only
+    the shards of changed files are rebuilt.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if not store_exists(CHUNKED_DATA_DIR):
+        print("No chunk store found. Run chunking first.")
+        return
+
+    manifest = load_manifest()
+    stage = manifest["embedding"]
+    chunk_store = ChunkStore(CHUNKED_DATA_DIR)
 
+    # Only patch the index when the manifest knows which ids it holds and it
+    # is already of the requested type and layout, with vectors of the
+    # current embedding model; otherwise rebuild it.
+    current_sharded = is_sharded_index(FAISS_INDEX_PATH)
+    index_exists = current_sharded or os.path.exists(os.path.join(FAISS_INDEX_PATH, INDEX_FILE))
+    current_config = load_index_config(FAISS_INDEX_PATH)
+    incremental = (
+        index_exists and bool(stage) and not rebuild
+        and current_config.get("index_type", "flat") == index_type
+        and indexed_embedding_model(current_config) == embedding_model_id()
+        and current_sharded == sharded
+    )
+    if not incremental:
+        stage.clear()
+
+    changed_sources = []
+    documents_to_add = []
+    ids_to_add = []
+    ids_to_delete = []
+    skipped = 0
+
+    for source in tqdm(chunk_store.sources, desc="Generating embeddings"):
         try:
-            documents = load_chunks_from_file(file_path, file)
-            if documents:
-                all_documents.extend(documents)
-                metadata_info[file] = len(documents)
-            else:
-                print(f"⚠️ No valid content in {file}")
+            # Chunk ids are content hashes, so hashing them fingerprints the source
+            ids = chunk_store.source_ids(source)
+            digest = hash_text("\n".join(ids))
+            if is_unchanged(manifest, "embedding", source, digest):
+                skipped += 1
+                continue
+
+            if not ids:
+                print(f"⚠️ No valid content in {source}")
+
+            changed_sources.append(source)
+            previous_ids = set(stage.get(source, {}).get("ids", []))
+            ids_to_delete.extend(previous_ids - set(ids))
+            new_ids = [chunk_id for chunk_id in ids if chunk_id not in previous_ids]
+            documents_to_add.extend(load_source_documents(chunk_store, source, new_ids))
+            ids_to_add.extend(new_ids)
+
+            stage[source] = {"hash": digest, "ids": ids}
 
         except Exception as e:
-            print(f"❌ Error processing {file}: {e}")
+            print(f"❌ Error processing {source}: {e}")
 
-    if not all_documents:
-        print("No documents found for embedding. Exiting.")
+    # Vectors of sources that are no longer in the chunk store
+    for file, record in prune_deleted(manifest, "embedding", set(chunk_store.sources)).items():
+        ids_to_delete.extend(record["ids"])
+        print(f"🗑️ Removing {len(record['ids'])} vectors of deleted file: {file}")
+
+    if sharded:
+        _process_shards(
+            chunk_store, manifest, changed_sources, len(ids_to_delete), skipped,
+            batch_size, workers, index_type, incremental
+        )
+        return
+
+    # HNSW graphs cannot drop vectors, and IVF lists keep the labels of the
+    # rest when they do, which then no longer match the store's id positions;
+    # rebuild both from the (cached) vectors instead
+    if incremental and ids_to_delete and index_type in ("hnsw", "ivf"):
+        incremental = False
+        documents_to_add = []
+        ids_to_add = []
+        for source, record in stage.items():
+            documents_to_add.extend(load_source_documents(chunk_store, source, record["ids"]))
+            ids_to_add.extend(record["ids"])
+
+    if incremental and not documents_to_add and not ids_to_delete:
+        chunk_store.close()
+        save_manifest(manifest)
+        print(f"✅ Index is up to date ({skipped} unchanged file(s)).")
+        return
+
+    if incremental:
+        migrate_index(FAISS_INDEX_PATH)
+        vector_store = load_vector_store(FAISS_INDEX_PATH, chunk_store=chunk_store, mmap=False)
+        index_config = load_index_config(FAISS_INDEX_PATH)
+        if ids_to_delete:
+            vector_store.delete(ids_to_delete)
+        if documents_to_add:
+            vectors, _ = embed_documents(documents_to_add, batch_size, workers)
+            with telemetry.span("update_index"):
+                vector_store.add_embeddings(
+                    zip([doc.page_content for doc in documents_to_add], vectors),
+                    metadatas=[doc.metadata for doc in documents_to_add],
+                    ids=ids_to_add
+                )
+    else:
+        if not documents_to_add:
+            chunk_store.close()
+            print("No documents found for embedding. Exiting.")
+            return
+        vectors, _ = embed_documents(documents_to_add, batch_size, workers)
+        with telemetry.span("build_index", index_type=index_type):
+            vector_store, index_config = build_vector_store(
+                documents_to_add, vectors, ids_to_add, chunk_store, index_type
+            )
+
+    # Everything derived before anything is written, and the manifest last:
+    # a failed run leaves the manifest describing what is on disk, so the
+    # next run redoes the same changes
+    with telemetry.span("topic_centroids"):
+        centroids = index_topic_centroids(vector_store.index)
+    with telemetry.span("save_index"):
+        save_vector_store(vector_store, FAISS_INDEX_PATH)
+        save_index_config(index_config, FAISS_INDEX_PATH)
+        remove_shards(FAISS_INDEX_PATH)
+        save_topic_centroids(centroids, FAISS_INDEX_PATH)
+    save_manifest(manifest)
+    chunk_store.close()
+    telemetry.count("vectors_added", len(ids_to_add))
+    telemetry.count("vectors_removed", len(ids_to_delete))
+
+    print(
+        f"✅ Embedding completed ({index_config['index_type']} index): {len(ids_to_add)} added, "
+        f"{len(ids_to_delete)} removed, {skipped} unchanged file(s). Saved to: {FAISS_INDEX_PATH}"
+    )
+
+def _process_shards(
+    chunk_store, manifest, changed_sources, removed, skipped, batch_size, workers, index_type, incremental
+):
+    """The sharded-layout end of `process_embeddings`."""
+    if incremental and not changed_sources and not removed:
+        chunk_store.close()
+        save_manifest(manifest)
+        print(f"✅ Index is up to date ({skipped} unchanged file(s)).")
         return
 
-    # Create FAISS vector store
-    vector_store = FAISS.from_documents(all_documents, embedding_model)
-    vector_store.save_local(FAISS_INDEX_PATH)
+    os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+    with telemetry.span("update_shards", shards=len(changed_sources)):
+        table, added = update_shards(
+            chunk_store, changed_sources, batch_size, workers, index_type, FAISS_INDEX_PATH
+        )
+    if not table:
+        chunk_store.close()
+        print("No documents found for embedding. Exiting.")
+        return
 
-    # Save metadata
-    with open(os.path.join(VECTORSTORE_DIR, "embedding_metadata.json"), "w") as f:
-        json.dump(metadata_info, f, indent=4)
+    save_index_config({
+        **INDEX_CONFIG, "index_type": index_type, "embedding_model": embedding_model_id(), "sharded": True
+    }, FAISS_INDEX_PATH)
+    _remove_single_index(FAISS_INDEX_PATH)
+    with telemetry.span("topic_centroids"):
+        save_topic_centroids(index_topic_centroids([
+            faiss.read_index(os.path.join(FAISS_INDEX_PATH, SHARDS_DIR, name, INDEX_FILE))
+            for name in table.values()
+        ]), FAISS_INDEX_PATH)
+    save_manifest(manifest)
+    chunk_store.close()
+    telemetry.count("vectors_added", added)
+    telemetry.count("vectors_removed", removed)
 
-    print(f"✅ Embedding completed. Saved to: {FAISS_INDEX_PATH}")
+    print(
+        f"✅ Embedding completed ({index_type} index, {len(table)} shards): {len(changed_sources)} "
+        f"shard(s) rebuilt with {added} vectors, {removed} vectors removed, {skipped} unchanged "
+        f"file(s). Saved to: {FAISS_INDEX_PATH}"
+    )
 
 if __name__ == "__main__":
-    process_embeddings()
+    parser = argparse.ArgumentParser(description="Embed chunks into the FAISS store.")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument(
+        "--workers", type=int, default=EMBEDDING_WORKERS,
+        help="CPU encoding processes (1 = encode in this process)."
+    )
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument(
+        "--rebuild", action="store_true",
+        help="Rebuild the whole index, e.g. to retrain IVF centroids on the current corpus."
+    )
+    parser.add_argument(
+        "--sharded", action=argparse.BooleanOptionalAction, default=SHARDED_INDEX,
+        help="Keep one index shard per source file (switching layouts rebuilds the index)."
+    )
+    parser.add_argument(
+        "--migrate", action="store_true",
+        help="Convert a legacy (pickled or L2) index to the current format without re-embedding."
+    )
+    parser.add_argument(
+        "--embedding-backend", choices=EMBEDDING_BACKENDS,
+        help="Encode chunks with this backend instead of EMBEDDING_BACKEND."
+    )
+    args = parser.parse_args()
+    if args.embedding_backend:
+        set_embedding_backend(args.embedding_backend)
+    if args.migrate:
+        if not migrate_index():
+            print("Index is already in the current format.")
+    else:
+        process_embeddings(
+            batch_size=args.batch_size, workers=args.workers,
+            index_type=args.index_type, rebuild=args.rebuild, sharded=args.sharded
+        )
@@ -1,62 +1,25 @@
 import os
-import re
+import asyncio
 import logging
-from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_mistralai.chat_models import ChatMistralAI
+import argparse
+import threading
+from contextlib import nullcontext
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from pydantic import BaseModel, ConfigDict
+import telemetry
+from context_builder import build_context, token_budget
+from manifest import hash_text
+from query_gate import is_telecom_query
+from resources import EMBEDDING_BACKENDS, LLM_MODEL_NAME, get_llm, index_version, set_embedding_backend
+from response_cache import RESPONSE_CACHE_ENABLED, ResponseCache
+from retrieval import CachedRetriever, embed_query, request_k
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-load_dotenv()
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-if not MISTRAL_API_KEY:
-    raise ValueError("MISTRAL_API_KEY not set in environment variables!")
-
-VECTORSTORE_DIR = "vectorstore"
-FAISS_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "faiss_index")
-
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-vector_store = FAISS.load_local(FAISS_INDEX_PATH, embedding_model, allow_dangerous_deserialization=True)
-
-# You can customize 'k' here or pass it dynamically
-retriever = vector_store.as_retriever(search_kwargs={"k": 2})
-
-# Initialize Mistral LLM
-llm = ChatMistralAI(
-    api_key=MISTRAL_API_KEY,
-    model="open-mistral-7b",
-    temperature=0.3,
-    max_tokens=2048
-)
-
-TELECOM_KEYWORDS = [
-    "5G", "4G", "3G", "network", "tower", "signal", "latency", "bandwidth",
-    "telecom", "fiber", "Switch", "VoLTE", "spectrum", "wireless", "antenna",
-    "cellular", "coverage", "base station", "call drop", "frequency", "roaming",
-    "backhaul", "microwave link", "carrier aggregation", "handovers",
-    "power supply", "UPS", "voltage", "current", "battery backup", "inverter",
-    "DC rectifier", "generator", "power failure", "electrical outage", "load balancing",
-    "fault protection", "circuit breaker", "transformer", "power distribution unit",
-    "fault", "error", "diagnostics", "debugging", "alarm", "packet loss",
-    "throughput", "interference", "jitter", "latency issues", "outage", "connectivity issue",
-    "network congestion", "slow speed", "ping test", "signal drop", "no service",
-    "modulation", "demodulation", "retransmission", "bit error rate", "network reset"
-]
-
-def is_telecom_query(query):
-    """Improved telecom keyword detection using regex word boundaries."""
-    query_lower = query.lower()
-    for keyword in TELECOM_KEYWORDS:
-        # Use regex to avoid partial matches
-        pattern = rf'\b{re.escape(keyword.lower())}\b'
-        if re.search(pattern, query_lower):
-            return True
-    return False
+# Embedding model, vector store and Mistral LLM are loaded lazily by
+# `resources` on the first request (or by `resources.warm_up()`).
 
 PROMPT_TEMPLATES = {
     "report": PromptTemplate(
@@ -101,9 +64,64 @@ def get_prompt(doc_type):
     """Fetch prompt template, fallback to default if unknown type."""
     return PROMPT_TEMPLATES.get(doc_type.lower(), PROMPT_TEMPLATES["default"])
 
+# One QA chain per prompt template, built on first use and shared by all
+# requests; k is set per request with `request_k`, never on the chain
+_qa_chains = {}
+_qa_chains_lock = threading.Lock()
+
+def get_qa_chain(doc_type):
+    """Shared QA chain for a document type (unknown types use the default prompt)."""
+    key = doc_type.lower() if doc_type.lower() in PROMPT_TEMPLATES else "default"
+    chain = _qa_chains.get(key)
+    if chain is None:
+        with _qa_chains_lock:
+            chain = _qa_chains.get(key)
+            if chain is None:
+                chain = CustomRetrievalQA.from_chain_type(
+                    llm=get_llm(),
+                    chain_type="stuff",
+                    retriever=CachedRetriever(),
+                    return_source_documents=True,
+                    chain_type_kwargs={"prompt": get_prompt(key)}
+                )
+                _qa_chains[key] = chain
+    return chain
+
+# Generated responses reused across requests and processes (None disables)
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+
+def _relevant_doc(source_docs):
+    if source_docs:
+        return source_docs[0].metadata.get("source", "No relevant document found.")
+    return "No relevant document found."
+
+def _format_prompt(doc_type, query, source_docs):
+    """The prompt the "stuff" chain sends for these documents."""
+    return get_prompt(doc_type).format(
+        context="\n\n".join(doc.page_content for doc in source_docs), question=query
+    )
+
+def _response_cache_key(query, doc_type, source_docs):
+    """
+    Response cache lookup arguments for a request, or None if caching is off.
+
+    The scope covers the model, prompt template and context budget, so
+    changing any of them never serves old responses.
+    """
+    if response_cache is None:
+        return None
+    scope = hash_text(
+        f"{LLM_MODEL_NAME}\n{get_prompt(doc_type).template}\n{token_budget(doc_type)}"
+    )
+    chunk_ids = [str(doc.metadata.get("chunk_id")) for doc in source_docs]
+    return scope, chunk_ids, embed_query(query), hash_text(repr(index_version()))
+
 def generate_response(query, doc_type="report", k=2):
     """
     Generate response using RetrievalQA chain with Mistral.
+
+    Responses are served from `response_cache` when the same chunks were
+    retrieved for a near-identical query.
     Parameters:
         query (str): user question
         doc_type (str): type of document response expected
@@ -111,42 +129,148 @@ def generate_response(query, doc_type="report", k=2):
     Returns:
         response (str), relevant_doc (str), doc_type (str)
     """
+    with telemetry.span("generate_response", doc_type=doc_type, k=k):
+        try:
+            with telemetry.span("query_gate"):
+                in_scope = is_telecom_query(query)
+            if not in_scope:
+                return "WARNING: This query is outside the scope of telecom-related topics.", None, doc_type
+
+            chain = get_qa_chain(doc_type)
+            with request_k(k):
+                source_docs = chain.retriever.invoke(query)
+            relevant_doc = _relevant_doc(source_docs)
+
+            with telemetry.span("response_cache_get"):
+                cache_key = _response_cache_key(query, doc_type, source_docs)
+                cached = cache_key and response_cache.get(*cache_key)
+            if cached:
+                telemetry.count("response_cache_hits")
+                return cached[0], relevant_doc, doc_type
+            if cache_key:
+                telemetry.count("response_cache_misses")
+
+            # The chain's own retrieval step is skipped: the documents are known
+            context = build_context(source_docs, doc_type)
+            with telemetry.span("llm"):
+                result = chain.combine_documents_chain.invoke(
+                    {"input_documents": context.documents, "question": query}
+                )
+            response = result.get("output_text", "No response generated.")
+            if cache_key:
+                with telemetry.span("response_cache_set"):
+                    response_cache.set(*cache_key, response, relevant_doc)
+
+            return response, relevant_doc, doc_type
+
+        except Exception as e:
+            logging.error(f"Error generating response: {e}")
+            return f"Error: {str(e)}", None, doc_type
+
+# Streamed generations allowed at once per process; further requests wait
+# for a slot. A thread semaphore bounds them across every event loop (each
+# Streamlit session runs its own), polled so waiting stays cancellable.
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "4"))
+SLOT_POLL_INTERVAL = 0.01
+_generation_slots = threading.BoundedSemaphore(MAX_CONCURRENT_GENERATIONS)
+
+async def _acquire_generation_slot():
+    while not _generation_slots.acquire(blocking=False):
+        await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+async def astream_response(query, doc_type="report", k=2):
+    """
+    Async, token-streaming version of `generate_response`.
+
+    Yields ("source", relevant_doc) once the context is retrieved, then
+    ("token", text) pieces as the LLM produces them, so callers can show
+    output after the first token instead of the whole document. A cached
+    response comes back as a single token without taking a generation slot.
+    """
+    # Spans that contain a yield are opened on the trace directly; only
+    # blocks without one activate it for the spans of library code
+    trace = telemetry.start_trace("astream_response", doc_type=doc_type, k=k)
     try:
-        if not is_telecom_query(query):
-            return "WARNING: This query is outside the scope of telecom-related topics.", None, doc_type
+        with trace.activate(), trace.span("query_gate"):
+            in_scope = is_telecom_query(query)
+        if not in_scope:
+            yield "source", None
+            yield "token", "WARNING: This query is outside the scope of telecom-related topics."
+            return
 
-        # Update retriever with new k dynamically
-        retriever.search_kwargs["k"] = k
+        try:
+            chain = get_qa_chain(doc_type)
+            with trace.activate(), request_k(k):
+                source_docs = await chain.retriever.ainvoke(query)
+            relevant_doc = _relevant_doc(source_docs)
+            yield "source", relevant_doc
 
-        prompt = get_prompt(doc_type)
-        qa_chain = CustomRetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": prompt}
-        )
+            with trace.activate(), trace.span("response_cache_get"):
+                cache_key = await asyncio.to_thread(_response_cache_key, query, doc_type, source_docs)
+                cached = cache_key and await asyncio.to_thread(response_cache.get, *cache_key)
+            if cached:
+                trace.count("response_cache_hits")
+                yield "token", cached[0]
+                return
+            if cache_key:
+                trace.count("response_cache_misses")
 
-        result = qa_chain.invoke({"query": query})
-        response = result.get("result", "No response generated.")
+            tokens = []
+            with trace.activate():
+                prompt = _format_prompt(doc_type, query, build_context(source_docs, doc_type).documents)
+            with trace.span("generation_slot_wait"):
+                await _acquire_generation_slot()
+            try:
+                with trace.span("llm"):
+                    async for chunk in get_llm().astream(prompt):
+                        if chunk.content:
+                            tokens.append(chunk.content)
+                            yield "token", chunk.content
+                trace.count("llm_stream_chunks", len(tokens))
+            finally:
+                _generation_slots.release()
 
-        source_docs = result.get("source_documents") or []
-        if source_docs:
-            relevant_doc = source_docs[0].metadata.get("source", "No relevant document found.")
-        else:
-            relevant_doc = "No relevant document found."
+            # Only complete responses are cached; a closed stream never gets here
+            if cache_key:
+                with trace.span("response_cache_set"):
+                    await asyncio.to_thread(response_cache.set, *cache_key, "".join(tokens), relevant_doc)
 
-        return response, relevant_doc, doc_type
+        except Exception as e:
+            logging.error(f"Error generating response: {e}")
+            yield "token", f"Error: {str(e)}"
+    finally:
+        trace.finish()
 
-    except Exception as e:
-        logging.error(f"Error generating response: {e}")
-        return f"Error: {str(e)}", None, doc_type
+def stream_response(query, doc_type="report", k=2):
+    """Synchronous iterator over `astream_response` events, for Streamlit."""
+    loop = asyncio.new_event_loop()
+    events = astream_response(query, doc_type, k)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a telecom document for one query.")
+    parser.add_argument(
+        "--embedding-backend", choices=EMBEDDING_BACKENDS,
+        help="Encode the query with this backend instead of EMBEDDING_BACKEND."
+    )
+    parser.add_argument("--profile", help="Write a cProfile profile of the request to this file.")
+    args = parser.parse_args()
+    if args.embedding_backend:
+        set_embedding_backend(args.embedding_backend)
+
     query = input("Enter a query: ").strip()
     doc_type = input("Enter document type (report/sop/summary): ").strip().lower()
     if doc_type not in PROMPT_TEMPLATES:
         print(f"Unknown document type '{doc_type}', defaulting to generic response.")
         doc_type = "default"
-    response, relevant_doc, _ = generate_response(query, doc_type)
+    with telemetry.profile(args.profile) if args.profile else nullcontext():
+        response, relevant_doc, _ = generate_response(query, doc_type)
     print(f"\nGenerated {doc_type}:\n{response}\n\nRelevant document: {relevant_doc}")
@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import heapq
+import shutil
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from manifest import hash_text
+from resources import FAISS_INDEX_PATH, load_vector_store
+
+# Sharded index layout (in the index directory, instead of index.faiss):
+#   shards.json         source file -> shard directory name
+#   shards/<name>/      one complete index per source, in the usual format
+#   index_config.json   type of every shard, with "sharded": true
+#   topic_centroids.npy query gate centroids over all shards
+SHARDS_FILE = "shards.json"
+SHARDS_DIR = "shards"
+
+# Threads searching shards at once; 1 searches them one after another
+SHARD_SEARCH_THREADS = int(os.getenv("SHARD_SEARCH_THREADS", str(min(8, os.cpu_count() or 1))))
+# Vectors a search must cover before it is spread over threads; below this
+# handing shards to threads costs more than scanning them in turn
+SHARD_PARALLEL_MIN_VECTORS = int(os.getenv("SHARD_PARALLEL_MIN_VECTORS", "50000"))
+
+def source_of(chunk_id):
+    """Source file of a chunk id (ids are "<source>#<hash>")."""
+    return chunk_id.rpartition("#")[0]
+
+def matches_sources(source, sources):
+    """True if `source` matches a name or glob pattern in `sources` (None matches all)."""
+    if sources is None:
+        return True
+    return any(fnmatch.fnmatchcase(source, pattern) for pattern in sources)
+
+def shard_dir_name(source):
+    """Directory name of a source's shard: readable, and unique per source name."""
+    readable = re.sub(r"[^\w.-]", "_", source)
+    return f"{readable}-{hash_text(source)[:8]}"
+
+def is_sharded_index(path=FAISS_INDEX_PATH):
+    """True if the index at `path` is split into per-source shards."""
+    return os.path.exists(os.path.join(path, SHARDS_FILE))
+
+def load_shard_table(path=FAISS_INDEX_PATH):
+    """Source file -> shard directory name; empty if the index is not sharded."""
+    if not is_sharded_index(path):
+        return {}
+    with open(os.path.join(path, SHARDS_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)["shards"]
+
+def save_shard_table(table, path=FAISS_INDEX_PATH):
+    """Write the shard table; written last, it publishes rebuilt shards to readers."""
+    table_path = os.path.join(path, SHARDS_FILE)
+    with open(table_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"shards": dict(sorted(table.items()))}, f, indent=4)
+    os.replace(table_path + ".tmp", table_path)
+
+def remove_unused_shards(table, path=FAISS_INDEX_PATH):
+    """Delete shard directories the table no longer points to."""
+    shards_path = os.path.join(path, SHARDS_DIR)
+    if not os.path.isdir(shards_path):
+        return
+    used = set(table.values())
+    for name in os.listdir(shards_path):
+        if name not in used:
+            shutil.rmtree(os.path.join(shards_path, name), ignore_errors=True)
+
+def remove_shards(path=FAISS_INDEX_PATH):
+    """Remove the sharded layout, e.g. when the index is rebuilt as one."""
+    shutil.rmtree(os.path.join(path, SHARDS_DIR), ignore_errors=True)
+    if is_sharded_index(path):
+        os.remove(os.path.join(path, SHARDS_FILE))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _search_pool():
+    # Created on first use, so processes forked by `server` each get their own
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(SHARD_SEARCH_THREADS, thread_name_prefix="shard-search")
+        return _pool
+
+class ShardedIndex:
+    """
+    Per-source FAISS stores searched as one index.
+
+    A search visits only the shards whose source matches the filter, and
+    merges their hits by cosine similarity, which every shard scores alike.
+    Large unfiltered searches fan out over `SHARD_SEARCH_THREADS` threads
+    (faiss releases the GIL while it searches).
+    """
+
+    def __init__(self, path=FAISS_INDEX_PATH, embedding_model=None, chunk_store=None):
+        self.path = path
+        self.shards = {
+            source: load_vector_store(
+                os.path.join(path, SHARDS_DIR, name), embedding_model, chunk_store
+            )
+            for source, name in load_shard_table(path).items()
+        }
+
+    def __len__(self):
+        return sum(store.index.ntotal for store in self.shards.values())
+
+    def select(self, sources=None):
+        """The stores of the shards whose source matches `sources`."""
+        return [store for source, store in self.shards.items() if matches_sources(source, sources)]
+
+    def search(self, vectors, k, search_shard, sources=None):
+        """
+        Top-k (store, index position, similarity) hits per query vector over
+        the matching shards.
+
+        `search_shard(store, vectors)` returns, per query, (position,
+        similarity) pairs of one store; each call gets its own copy of the
+        vectors, as faiss normalises them in place.
+        """
+        stores = self.select(sources)
+        if not stores:
+            return [[] for _ in range(len(vectors))]
+
+        def search_one(store):
+            return [
+                [(store, idx, similarity) for idx, similarity in positions]
+                for positions in search_shard(store, vectors.copy())
+            ]
+
+        if len(stores) > 1 and SHARD_SEARCH_THREADS > 1 and \
+                sum(store.index.ntotal for store in stores) >= SHARD_PARALLEL_MIN_VECTORS:
+            per_shard = list(_search_pool().map(search_one, stores))
+        else:
+            per_shard = [search_one(store) for store in stores]
+        if len(per_shard) == 1:
+            return per_shard[0]
+        return [
+            heapq.nlargest(k, (hit for hits in query_hits for hit in hits), key=lambda hit: hit[2])
+            for query_hits in zip(*per_shard)
+        ]
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+from collections import Counter
+import numpy as np
+
+# BM25 inverted index over the chunk store, for exact terms such as section
+# numbers ("1.5.2") and codes that dense embeddings match poorly.
+#   postings.npy     chunk numbers of every term's postings, term after term
+#   frequencies.npy  term frequency of each posting
+#   doc_lengths.npy  token count of each chunk
+#   lexical.json     vocabulary (term -> postings slice), chunk ids, BM25 settings
+LEXICAL_INDEX_DIR = "data/lexical"
+POSTINGS_FILE = "postings.npy"
+FREQUENCIES_FILE = "frequencies.npy"
+DOC_LENGTHS_FILE = "doc_lengths.npy"
+META_FILE = "lexical.json"
+LEXICAL_INDEX_VERSION = 1
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words and numbers; dotted runs like section "1.5.2" stay one token
+TOKEN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+def tokenize(text):
+    """Lower-cased word and number tokens of a text."""
+    return TOKEN.findall(text.lower())
+
+def lexical_index_exists(directory=LEXICAL_INDEX_DIR):
+    """True if a complete lexical index is present in `directory`."""
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+def _save_array(path, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+def build_lexical_index(chunk_store, directory=LEXICAL_INDEX_DIR, k1=BM25_K1, b=BM25_B):
+    """
+    Build the BM25 index of every chunk in `chunk_store` and write it to `directory`.
+
+    Hits are stored by chunk id, so an index that lags behind the chunk store
+    only misses new chunks. Returns the number of distinct terms.
+    """
+    postings = {}
+    doc_lengths = []
+    ids = []
+    for source in chunk_store.sources:
+        for chunk in chunk_store.iter_source(source):
+            counts = Counter(tokenize(chunk.text))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((len(ids), count))
+            doc_lengths.append(sum(counts.values()))
+            ids.append(chunk.id)
+
+    vocab = {}
+    doc_numbers = []
+    frequencies = []
+    for term in sorted(postings):
+        vocab[term] = [len(doc_numbers), len(postings[term])]
+        for doc, count in postings[term]:
+            doc_numbers.append(doc)
+            frequencies.append(count)
+
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        POSTINGS_FILE: np.array(doc_numbers, dtype=np.int32),
+        FREQUENCIES_FILE: np.array(frequencies, dtype=np.float32),
+        DOC_LENGTHS_FILE: np.array(doc_lengths, dtype=np.float32),
+    }
+    for name, array in arrays.items():
+        _save_array(os.path.join(directory, name + ".tmp"), array)
+    with open(os.path.join(directory, META_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": LEXICAL_INDEX_VERSION,
+            "k1": k1,
+            "b": b,
+            "avg_doc_length": float(np.mean(doc_lengths)) if doc_lengths else 0.0,
+            "ids": ids,
+            "vocab": vocab,
+        }, f)
+
+    # Metadata goes last, as in the chunk store
+    for name in (*arrays, META_FILE):
+        path = os.path.join(directory, name)
+        os.replace(path + ".tmp", path)
+    return len(vocab)
+
+class LexicalIndex:
+    """
+    Read-only BM25 index; postings are memory-mapped and scored with numpy.
+    """
+
+    def __init__(self, directory=LEXICAL_INDEX_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != LEXICAL_INDEX_VERSION:
+            raise ValueError(f"Unsupported lexical index version: {meta.get('version')}")
+
+        self.ids = meta["ids"]
+        self.vocab = meta["vocab"]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.avg_doc_length = meta["avg_doc_length"] or 1.0
+        self._postings = np.load(os.path.join(directory, POSTINGS_FILE), mmap_mode="r")
+        self._frequencies = np.load(os.path.join(directory, FREQUENCIES_FILE), mmap_mode="r")
+        self._doc_lengths = np.load(os.path.join(directory, DOC_LENGTHS_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k, positions=None):
+        """
+        Top-k (chunk id, BM25 score) pairs for a query, best first.
+
+        Only chunks sharing at least one term with the query are scored;
+        `positions` (sorted chunk positions) limits them further.
+        """
+        docs = []
+        contributions = []
+        num_docs = len(self.ids)
+        for term in set(tokenize(query)):
+            if term not in self.vocab:
+                continue
+            start, count = self.vocab[term]
+            term_docs = self._postings[start:start + count]
+            frequencies = self._frequencies[start:start + count]
+            idf = np.log(1 + (num_docs - count + 0.5) / (count + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[term_docs] / self.avg_doc_length)
+            docs.append(term_docs)
+            contributions.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+
+        if not docs:
+            return []
+        docs = np.concatenate(docs)
+        contributions = np.concatenate(contributions)
+        if positions is not None:
+            allowed = np.isin(docs, positions, assume_unique=False)
+            docs, contributions = docs[allowed], contributions[allowed]
+            if not len(docs):
+                return []
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[unique_docs[i]], float(scores[i])) for i in top]
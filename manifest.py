@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+
+# Single manifest shared by the preprocess -> chunk -> embed stages
+MANIFEST_PATH = "data/manifest.json"
+MANIFEST_VERSION = 1
+
+# One section per stage, keyed by the stage's input file name
+STAGES = ("preprocess", "chunking", "embedding")
+
+def hash_bytes(data):
+    """Return the SHA-256 hex digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of a UTF-8 string."""
+    return hash_bytes(text.encode("utf-8"))
+
+def hash_file(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_chunk_id(source, chunk_hash, occurrence=0):
+    """Build the id of the `occurrence`-th chunk with this hash in `source`."""
+    chunk_id = f"{source}#{chunk_hash[:16]}"
+    if occurrence:
+        chunk_id = f"{chunk_id}-{occurrence}"
+    return chunk_id
+
+def make_chunk_ids(source, chunk_hashes):
+    """
+    Build stable ids for the chunks of one source file.
+
+    Ids depend on the chunk content rather than its position, so inserting
+    text at the top of a document does not invalidate every later vector.
+    Repeated chunks within a file get an occurrence suffix to stay unique.
+    """
+    seen = {}
+    ids = []
+    for chunk_hash in chunk_hashes:
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(make_chunk_id(source, chunk_hash, occurrence))
+    return ids
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest, returning an empty one if missing or outdated."""
+    manifest = {"version": MANIFEST_VERSION}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("version") == MANIFEST_VERSION:
+            manifest = stored
+    for stage in STAGES:
+        manifest.setdefault(stage, {})
+    return manifest
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Atomically write the manifest so an interrupted run never corrupts it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_unchanged(manifest, stage, name, digest, output_path=None):
+    """True if `name` was already handled by `stage` with the same input hash."""
+    record = manifest[stage].get(name)
+    if not record or record.get("hash") != digest:
+        return False
+    return output_path is None or os.path.exists(output_path)
+
+def prune_deleted(manifest, stage, present_names):
+    """Drop records whose input no longer exists and return them."""
+    removed = {
+        name: record
+        for name, record in manifest[stage].items()
+        if name not in present_names
+    }
+    for name in removed:
+        del manifest[stage][name]
+    return removed
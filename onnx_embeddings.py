@@ -0,0 +1,117 @@
+import os
+import argparse
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from resources import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR
+
+# Exported model directory layout, written by `export_model`
+TOKENIZER_FILE = "tokenizer.json"
+MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+# Same input limit as the sentence-transformers model (longer texts are truncated)
+MAX_SEQ_LENGTH = 256
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+# Threads onnxruntime spreads one batch over; 0 lets it use every core
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on onnxruntime: the exported transformer, plus the mean
+    pooling and normalisation sentence-transformers adds, in numpy.
+
+    Needs only `onnxruntime` and `tokenizers` at query time, not torch.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, backend="onnx", threads=ONNX_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        model_path = os.path.join(model_dir, MODEL_FILES[backend])
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"No ONNX model at {model_path}. Run `python onnx_embeddings.py` to export it."
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]"), pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        token_vectors = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        # Mean over the real tokens, then unit length, as the sentence-transformers model does
+        weights = mask[:, :, None].astype(np.float32)
+        vectors = (token_vectors * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts, batch_size=ONNX_BATCH_SIZE):
+        """Unit-length vectors for `texts` as a float32 array, in input order."""
+        # Batches of similar length pad less
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            vectors[batch] = self._encode_batch([texts[i] for i in batch])
+        return vectors
+
+    def embed_documents(self, texts):
+        # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+        return self.encode([text.replace("\n", " ") for text in texts]).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def export_model(model_dir=ONNX_MODEL_DIR, quantize=True):
+    """
+    Export the HuggingFace model to ONNX and, if `quantize`, a copy with
+    dynamically int8-quantised weights.
+
+    Export needs torch, transformers and onnx; the exported files need neither.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    name = f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    model = AutoModel.from_pretrained(name).eval()
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer.save_pretrained(model_dir)
+
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    example = tokenizer(["Battery backup sizing for a UPS at the site"], return_tensors="pt")
+    dynamic_axes = {axis: {0: "batch", 1: "sequence"} for axis in input_names + ["last_hidden_state"]}
+    model_path = os.path.join(model_dir, MODEL_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(example[input_name] for input_name in input_names), model_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=14
+        )
+    print(f"✅ Exported {name} to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(model_dir, MODEL_FILES["onnx-int8"])
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"✅ Quantised weights to int8 in {quantized_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the embedding model to ONNX for EMBEDDING_BACKEND=onnx / onnx-int8."
+    )
+    parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 copy.")
+    args = parser.parse_args()
+
+    export_model(args.model_dir, quantize=not args.no_quantize)
@@ -0,0 +1,90 @@
+import os
+import re
+import logging
+import numpy as np
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+
+TELECOM_KEYWORDS = [
+    "5G", "4G", "3G", "network", "tower", "signal", "latency", "bandwidth",
+    "telecom", "fiber", "Switch", "VoLTE", "spectrum", "wireless", "antenna",
+    "cellular", "coverage", "base station", "call drop", "frequency", "roaming",
+    "backhaul", "microwave link", "carrier aggregation", "handover",
+    "power supply", "UPS", "voltage", "current", "battery backup", "inverter",
+    "DC rectifier", "generator", "power failure", "electrical outage", "load balancing",
+    "fault protection", "circuit breaker", "transformer", "power distribution unit",
+    "fault", "error", "diagnostics", "debugging", "alarm", "packet loss",
+    "throughput", "interference", "jitter", "latency issues", "outage", "connectivity issue",
+    "network congestion", "slow speed", "ping test", "signal drop", "no service",
+    "modulation", "demodulation", "retransmission", "bit error rate", "network reset"
+]
+
+def compile_keyword_pattern(keywords):
+    """
+    One case-insensitive alternation matching any keyword as a whole word.
+
+    Plurals ("towers", "switches") match too, and multi-word keywords accept
+    any run of whitespace between words.
+    """
+    alternatives = [
+        r"\s+".join(re.escape(word) for word in keyword.split())
+        for keyword in sorted(keywords, key=len, reverse=True)
+    ]
+    return re.compile(
+        rf"(?<![a-z0-9])(?:{'|'.join(alternatives)})(?:e?s)?(?![a-z0-9])",
+        re.IGNORECASE
+    )
+
+TELECOM_PATTERN = compile_keyword_pattern(TELECOM_KEYWORDS)
+
+# Optional embedding fallback for queries without a keyword: the query is in
+# scope if it is close enough to one of the corpus topic centroids.
+TOPIC_FALLBACK = os.getenv("TOPIC_FALLBACK", "0") == "1"
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.35"))
+# Written by embedding_generation next to the FAISS index
+TOPIC_CENTROIDS_FILE = "topic_centroids.npy"
+TOPIC_CLUSTERS = 16
+
+def compute_topic_centroids(vectors, clusters=TOPIC_CLUSTERS):
+    """Unit-length k-means centroids of the corpus chunk vectors."""
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    clusters = max(1, min(clusters, len(vectors) // 39))
+    kmeans = faiss.Kmeans(vectors.shape[1], clusters, niter=20, spherical=True, seed=1)
+    kmeans.train(vectors)
+    centroids = kmeans.centroids.copy()
+    faiss.normalize_L2(centroids)
+    return centroids
+
+def topic_similarity(embedding, centroids):
+    """Highest cosine similarity between a query embedding and the topic centroids."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector = vector / (np.linalg.norm(vector) or 1.0)
+    return float(np.max(centroids @ vector))
+
+def matches_telecom_keyword(query):
+    """True if the query mentions any telecom keyword (single regex pass)."""
+    return TELECOM_PATTERN.search(query) is not None
+
+def is_telecom_query(query, fallback=None):
+    """
+    Decide whether a query is in the telecom scope.
+
+    The keyword match costs microseconds and needs no model. With `fallback`
+    (default TOPIC_FALLBACK), queries without a keyword are embedded and
+    compared against the topic centroids; the embedding is cached, so the
+    retrieval that follows does not compute it again.
+    """
+    if matches_telecom_keyword(query):
+        return True
+    if not (TOPIC_FALLBACK if fallback is None else fallback):
+        return False
+
+    from resources import get_topic_centroids
+    centroids = get_topic_centroids()
+    if centroids is None:
+        logging.warning("No topic centroids found; run embedding_generation to create them.")
+        return False
+    from retrieval import embed_query
+    return topic_similarity(embed_query(query), centroids) >= TOPIC_SIMILARITY_THRESHOLD
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+
+load_dotenv()
+
+VECTORSTORE_DIR = "vectorstore"
+FAISS_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "faiss_index")
+CHUNKED_DATA_DIR = "data/chunks"
+LEXICAL_INDEX_DIR = "data/lexical"
+# Index directory layout: the faiss index, the chunk id of each vector
+# position (texts live in the chunk store), and how the index scores vectors
+INDEX_FILE = "index.faiss"
+INDEX_IDS_FILE = "index_ids.json"
+INDEX_CONFIG_FILE = "index_config.json"
+# Pickled docstore written by FAISS.save_local in older versions
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+# How queries and chunks are encoded: "torch" (sentence-transformers),
+# "onnx" (the exported model on onnxruntime, no torch import) or
+# "onnx-int8" (the same with int8 weights; slightly different vectors).
+# The ONNX backends need `pip install -r requirements-onnx.txt`
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Written by `python onnx_embeddings.py`
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("models", EMBEDDING_MODEL_NAME))
+LLM_MODEL_NAME = "open-mistral-7b"
+MISTRAL_BASE_URL = os.getenv("MISTRAL_BASE_URL", "https://api.mistral.ai/v1")
+# Connections kept open to the Mistral API, shared by all requests of a
+# process; size it to the requests generating at once (httpx keeps 20)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_TIMEOUT_SECONDS = int(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+# One instance of each resource per process, created on first use
+_resources = {}
+_lock = threading.RLock()
+
+# Seconds spent creating each resource, for startup reporting
+startup_timings = {}
+
+def _get_or_create(name, factory):
+    """Return the named resource, creating it exactly once across threads."""
+    resource = _resources.get(name)
+    if resource is not None:
+        return resource
+    with _lock:
+        if name not in _resources:
+            start = time.perf_counter()
+            _resources[name] = factory()
+            startup_timings[name] = time.perf_counter() - start
+            logging.info(f"Loaded {name} in {startup_timings[name]:.2f}s")
+        return _resources[name]
+
+def _create_embedding_model():
+    if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}', expected one of {EMBEDDING_BACKENDS}")
+    if EMBEDDING_BACKEND != "torch":
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(ONNX_MODEL_DIR, EMBEDDING_BACKEND)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    # Unit-length vectors make inner product equal to cosine similarity
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        encode_kwargs={"normalize_embeddings": True}
+    )
+
+def set_embedding_backend(backend):
+    """Use `backend` instead of EMBEDDING_BACKEND from the environment, e.g. from a CLI flag."""
+    global EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    EMBEDDING_BACKEND = backend
+    reset("embedding_model")
+
+def embedding_model_id():
+    """
+    Name the current backend's vectors are cached under. The fp32 ONNX model
+    computes the torch model's vectors, so only int8 needs its own.
+    """
+    if EMBEDDING_BACKEND == "onnx-int8":
+        return f"{EMBEDDING_MODEL_NAME}-int8"
+    return EMBEDDING_MODEL_NAME
+
+def indexed_embedding_model(config):
+    """
+    Embedding model id of an index's vectors, from its config. Indexes that do
+    not record one were built before the backend choice, by the torch model.
+    """
+    return config.get("embedding_model", EMBEDDING_MODEL_NAME)
+
+def load_index_config(path=FAISS_INDEX_PATH):
+    """
+    Read the index config; indexes built before it existed are raw L2 indexes.
+    """
+    config_path = os.path.join(path, INDEX_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return {"metric": "l2", "normalize_L2": False}
+    with open(config_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_index_config(config, path=FAISS_INDEX_PATH):
+    """Write the index config next to the saved index."""
+    with open(os.path.join(path, INDEX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+
+def _distance_strategy(config):
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    if config["metric"] == "ip":
+        return DistanceStrategy.MAX_INNER_PRODUCT
+    return DistanceStrategy.EUCLIDEAN_DISTANCE
+
+def is_legacy_index(path=FAISS_INDEX_PATH):
+    """True if the index at `path` still keeps its documents in a pickled docstore."""
+    return not os.path.exists(os.path.join(path, INDEX_IDS_FILE))
+
+def load_vector_store(path=FAISS_INDEX_PATH, embedding_model=None, chunk_store=None, mmap=True):
+    """
+    Load a FAISS store from disk with the metric recorded in its config.
+
+    Vectors are memory-mapped (read-only, shared page cache across processes)
+    unless `mmap` is False, which loads a copy that can be modified. Documents
+    are read from the chunk store by id when a search returns them.
+    """
+    from langchain_community.vectorstores import FAISS
+    config = load_index_config(path)
+    embedding_model = embedding_model or get_embedding_model()
+
+    if is_legacy_index(path):
+        logging.warning(
+            f"{path} uses the old pickled docstore; run "
+            "`python embedding_generation.py --migrate` to convert it."
+        )
+        return FAISS.load_local(
+            path,
+            embedding_model,
+            allow_dangerous_deserialization=True,
+            distance_strategy=_distance_strategy(config),
+            normalize_L2=config.get("normalize_L2", False)
+        )
+
+    import faiss
+    from chunk_store import ChunkStoreDocstore
+    io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) if mmap else 0
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), io_flags)
+    with open(os.path.join(path, INDEX_IDS_FILE), "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    if len(ids) != index.ntotal:
+        raise ValueError(f"{path}: {len(ids)} ids for {index.ntotal} vectors.")
+
+    return FAISS(
+        embedding_model,
+        index,
+        ChunkStoreDocstore(chunk_store or get_chunk_store()),
+        # Searching only indexes positions; adding and deleting need a dict
+        ids if mmap else dict(enumerate(ids)),
+        distance_strategy=_distance_strategy(config),
+        normalize_L2=config.get("normalize_L2", False)
+    )
+
+def save_vector_store(vector_store, path=FAISS_INDEX_PATH):
+    """
+    Save the FAISS index and its position -> chunk id table, without a pickle.
+
+    Both files are written next to the target and swapped in, so readers never
+    see a half-written index.
+    """
+    import faiss
+    os.makedirs(path, exist_ok=True)
+    mapping = vector_store.index_to_docstore_id
+    if isinstance(mapping, dict):
+        mapping = [mapping[i] for i in range(len(mapping))]
+
+    index_path = os.path.join(path, INDEX_FILE)
+    ids_path = os.path.join(path, INDEX_IDS_FILE)
+    faiss.write_index(vector_store.index, index_path + ".tmp")
+    with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(mapping, f)
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(ids_path + ".tmp", ids_path)
+
+    legacy_path = os.path.join(path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+def _create_vector_store():
+    return load_vector_store()
+
+def _create_index_shards():
+    from index_shards import ShardedIndex
+    return ShardedIndex()
+
+def _create_chunk_store():
+    from chunk_store import ChunkStore
+    return ChunkStore(CHUNKED_DATA_DIR)
+
+def _create_lexical_index():
+    from lexical_index import LexicalIndex
+    return LexicalIndex(LEXICAL_INDEX_DIR)
+
+def load_topic_centroids(path=FAISS_INDEX_PATH):
+    """Topic centroids saved with the index, or None if there are none."""
+    import numpy as np
+    from query_gate import TOPIC_CENTROIDS_FILE
+    centroids_path = os.path.join(path, TOPIC_CENTROIDS_FILE)
+    if not os.path.exists(centroids_path):
+        return None
+    return np.load(centroids_path)
+
+def _llm_http_clients(api_key):
+    """
+    Sync and async HTTP clients for the Mistral API with one sized pool each.
+
+    Every connection of the pool stays open between requests, so concurrent
+    generations reuse warm TLS connections instead of reconnecting.
+    """
+    import httpx
+    options = {
+        "base_url": MISTRAL_BASE_URL,
+        "headers": {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        },
+        "timeout": LLM_TIMEOUT_SECONDS,
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS
+        ),
+    }
+    return httpx.Client(**options), httpx.AsyncClient(**options)
+
+def _create_llm():
+    from langchain_mistralai.chat_models import ChatMistralAI
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise ValueError("MISTRAL_API_KEY not set in environment variables!")
+    client, async_client = _llm_http_clients(api_key)
+    return ChatMistralAI(
+        api_key=api_key,
+        model=LLM_MODEL_NAME,
+        temperature=0.3,
+        max_tokens=2048,
+        client=client,
+        async_client=async_client,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_concurrent_requests=LLM_MAX_CONNECTIONS
+    )
+
+def get_embedding_model():
+    """Shared embedding model of the configured backend."""
+    return _get_or_create("embedding_model", _create_embedding_model)
+
+def get_vector_store():
+    """Shared FAISS vector store loaded from FAISS_INDEX_PATH."""
+    return _get_or_create("vector_store", _create_vector_store)
+
+def get_index_shards():
+    """Shared per-source shards of a sharded index at FAISS_INDEX_PATH."""
+    return _get_or_create("index_shards", _create_index_shards)
+
+def get_chunk_store():
+    """Shared memory-mapped chunk store."""
+    return _get_or_create("chunk_store", _create_chunk_store)
+
+def get_lexical_index():
+    """Shared BM25 index over the chunk store."""
+    return _get_or_create("lexical_index", _create_lexical_index)
+
+def get_topic_centroids():
+    """Shared telecom topic centroids for the query gate (None if not built)."""
+    return _get_or_create("topic_centroids", load_topic_centroids)
+
+def get_llm():
+    """Shared Mistral chat model; raises ValueError if no API key is set."""
+    return _get_or_create("llm", _create_llm)
+
+def index_version(path=FAISS_INDEX_PATH):
+    """Fingerprint (name, size, mtime) of the index files on disk; None if missing."""
+    if not os.path.isdir(path):
+        return None
+    return tuple(
+        (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+        for entry in sorted(os.scandir(path), key=lambda e: e.name)
+        if entry.is_file()
+    )
+
+def warm_up(llm=True):
+    """
+    Load every resource now instead of on the first request.
+
+    Returns:
+        dict: seconds spent loading each resource.
+    """
+    from index_shards import is_sharded_index
+    get_embedding_model()
+    if is_sharded_index():
+        get_index_shards()
+    else:
+        get_vector_store()
+    if os.path.isdir(LEXICAL_INDEX_DIR):
+        get_lexical_index()
+    if llm:
+        get_llm()
+    return dict(startup_timings)
+
+def override(name, resource):
+    """Replace a shared resource, e.g. with a stub model in benchmarks and checks."""
+    with _lock:
+        _resources[name] = resource
+
+def reset(name=None):
+    """Drop one cached resource (or all), e.g. after the index was rebuilt."""
+    with _lock:
+        if name is None:
+            _resources.clear()
+        else:
+            _resources.pop(name, None)
@@ -0,0 +1,160 @@
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+from manifest import hash_text
+
+# Generated responses, reused for repeated and paraphrased requests
+RESPONSE_CACHE_PATH = os.path.join("vectorstore", "response_cache.sqlite")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+# Minimum cosine similarity between query embeddings for a cache hit
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    context_key TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    response TEXT NOT NULL,
+    relevant_doc TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lookup ON responses (scope, context_key);
+"""
+
+def context_key(chunk_ids):
+    """Key of the retrieved context: the chunk ids in prompt order."""
+    return hash_text("\n".join(chunk_ids))
+
+class ResponseCache:
+    """
+    Persistent semantic cache of generated responses, shared by all processes.
+
+    An entry is reused when the request has the same scope (prompt and model),
+    retrieved the same chunks, and its query embedding is within
+    `similarity` (cosine) of the cached one. Entries expire after `ttl`
+    seconds, the least recently used go first past `maxsize`, and everything
+    cached under an older index version is dropped.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, maxsize=RESPONSE_CACHE_SIZE,
+                 ttl=RESPONSE_CACHE_TTL, similarity=RESPONSE_CACHE_SIMILARITY):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self._initialized = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(SCHEMA)
+                    self._initialized = True
+        return connection
+
+    def _cutoff(self):
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def get(self, scope, chunk_ids, embedding, index_version):
+        """Return (response, relevant_doc) of the closest matching entry, or None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT id, embedding, response, relevant_doc FROM responses "
+                "WHERE scope = ? AND context_key = ? AND index_version = ? AND created_at >= ?",
+                (scope, context_key(chunk_ids), index_version, self._cutoff())
+            ).fetchall()
+            best = None
+            best_similarity = self.similarity
+            for entry_id, blob, response, relevant_doc in rows:
+                similarity = float(np.frombuffer(blob, dtype=np.float32) @ query)
+                if similarity >= best_similarity:
+                    best, best_similarity = (entry_id, response, relevant_doc), similarity
+            if best is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            with connection:
+                connection.execute(
+                    "UPDATE responses SET last_used = ? WHERE id = ?", (time.time(), best[0])
+                )
+            with self._lock:
+                self.hits += 1
+            return best[1], best[2]
+        finally:
+            connection.close()
+
+    def set(self, scope, chunk_ids, embedding, index_version, response, relevant_doc):
+        """Store a response, then drop stale, expired and least recently used entries."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO responses (scope, context_key, index_version, embedding, "
+                    "response, relevant_doc, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (scope, context_key(chunk_ids), index_version, vector.tobytes(),
+                     response, relevant_doc, now, now)
+                )
+                invalidated = connection.execute(
+                    "DELETE FROM responses WHERE index_version != ?", (index_version,)
+                ).rowcount
+                expired = connection.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (self._cutoff(),)
+                ).rowcount
+                evicted = connection.execute(
+                    "DELETE FROM responses WHERE id IN (SELECT id FROM responses "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.maxsize,)
+                ).rowcount
+            with self._lock:
+                self.invalidations += invalidated
+                self.evictions += expired + evicted
+        finally:
+            connection.close()
+
+    def clear(self):
+        """Drop every entry; counters are kept."""
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM responses")
+        finally:
+            connection.close()
+
+    def __len__(self):
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        finally:
+            connection.close()
+
+    def stats(self):
+        """Return size and hit/miss counters (this process) as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,56 +1,601 @@
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import json
+import logging
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from array import array
+import faiss
+import numpy as np
+from typing import List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores.utils import DistanceStrategy
+import telemetry
+from cache import TTLCache
+from chunk_store import to_document
+from index_shards import is_sharded_index, matches_sources, source_of
+from resources import (
+    EMBEDDING_BACKENDS, LEXICAL_INDEX_DIR, embedding_model_id, get_chunk_store, get_embedding_model,
+    get_index_shards, get_lexical_index, get_vector_store, index_version, indexed_embedding_model,
+    load_index_config, reset, set_embedding_backend
+)
 
-VECTORSTORE_DIR = "vectorstore"
-FAISS_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "faiss_index")
+# Query caches: (model id, normalised query) -> embedding, (embedding, k, threshold) -> FAISS hits
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
 
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-vector_store = FAISS.load_local(
-    FAISS_INDEX_PATH, embedding_model, allow_dangerous_deserialization=True
-)
-retriever = vector_store.as_retriever(search_kwargs={"k": 3})  # Retrieve top 3 docs by default
+query_embedding_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+search_result_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+# (index kind, source filter) -> positions of the chunks it lets through,
+# or the faiss selector over them
+source_filter_cache = TTLCache(64)
+
+# dense: FAISS over MiniLM embeddings; lexical: BM25 only, no embedding
+# model; hybrid: reciprocal rank fusion of the two rankings
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+# Hits taken from each ranking before fusion, and the RRF rank constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = 60
+
+# Coalesces the query embeddings of concurrent requests into shared forward
+# passes (a `batching.MicroBatcher`, set by `server`); None embeds each
+# request's queries on their own
+query_batcher = None
+
+_loaded_index_version = None
+_loaded_lexical_version = None
+_index_version_lock = threading.Lock()
+# Embedding model id recorded with the loaded index, and the (index, query)
+# model pair last warned about
+_indexed_embedding_model = None
+_warned_embedding_models = None
+
+def _refresh_if_index_changed():
+    """Drop cached results and reload the store when the index on disk changes."""
+    global _loaded_index_version, _indexed_embedding_model
+    version = index_version()
+    if version == _loaded_index_version:
+        _check_embedding_model()
+        return
+    with _index_version_lock:
+        if version != _loaded_index_version:
+            search_result_cache.clear()
+            source_filter_cache.clear()
+            if _loaded_index_version is not None:
+                # Documents are read from the chunk store, so reopen it too
+                reset("vector_store")
+                reset("index_shards")
+                reset("chunk_store")
+                reset("topic_centroids")
+            _indexed_embedding_model = indexed_embedding_model(load_index_config())
+            _loaded_index_version = version
+    _check_embedding_model()
 
-def retrieve_relevant_documents(query, top_k=3, similarity_threshold=0.7):
+def _check_embedding_model():
+    """Warn (once) when queries are encoded by another model than the index's vectors."""
+    global _warned_embedding_models
+    models = (_indexed_embedding_model, embedding_model_id())
+    if models[0] and models[0] != models[1] and models != _warned_embedding_models:
+        _warned_embedding_models = models
+        logging.warning(
+            f"The index holds {models[0]} vectors but queries are encoded as {models[1]}; "
+            f"similarities are approximate until EMBEDDING_BACKEND matches or the index is rebuilt."
+        )
+
+def _refresh_if_lexical_changed():
+    """Reload the BM25 index and chunk store when chunking rewrote them."""
+    global _loaded_lexical_version
+    version = index_version(LEXICAL_INDEX_DIR)
+    if version == _loaded_lexical_version:
+        return
+    with _index_version_lock:
+        if version != _loaded_lexical_version:
+            source_filter_cache.clear()
+            if _loaded_lexical_version is not None:
+                reset("lexical_index")
+                reset("chunk_store")
+            _loaded_lexical_version = version
+
+def normalize_query(query):
+    """Lower-case and collapse whitespace; MiniLM is uncased so embeddings match."""
+    return " ".join(query.lower().split())
+
+def embed_query_batch(keys):
     """
-    Retrieve top-k relevant documents with similarity above threshold.
-    
-    Args:
-        query (str): Query text.
-        top_k (int): Number of top documents to retrieve.
-        similarity_threshold (float): Similarity threshold (0-1), higher is better.
-        
+    Embeddings of normalised queries, each distinct one encoded once.
+
+    The batch function of `query_batcher`, where concurrent requests often
+    ask the same question.
+    """
+    unique = list(dict.fromkeys(keys))
+    with telemetry.span("embed_batch", queries=len(unique)):
+        encoded = dict(zip(unique, get_embedding_model().embed_documents(unique)))
+    telemetry.count("embed_batches")
+    return [encoded[key] for key in keys]
+
+def embed_query(query):
+    """Embed a query, reusing the vector of an identical normalised query."""
+    key = normalize_query(query)
+    cache_key = (embedding_model_id(), key)
+    embedding = query_embedding_cache.get(cache_key)
+    if embedding is None:
+        telemetry.count("query_embedding_cache_misses")
+        with telemetry.span("embed_query"):
+            if query_batcher is not None:
+                embedding = query_batcher.submit([key])[0]
+            else:
+                embedding = get_embedding_model().embed_query(key)
+        query_embedding_cache.set(cache_key, embedding)
+    else:
+        telemetry.count("query_embedding_cache_hits")
+    return embedding
+
+def embed_queries(queries):
+    """Embed many queries, encoding all cache misses in one batched forward pass."""
+    model_id = embedding_model_id()
+    keys = [normalize_query(query) for query in queries]
+    embeddings = [query_embedding_cache.get((model_id, key)) for key in keys]
+    missing = sorted({key for key, embedding in zip(keys, embeddings) if embedding is None})
+    telemetry.count("query_embedding_cache_hits", len(keys) - len(missing))
+    if missing:
+        telemetry.count("query_embedding_cache_misses", len(missing))
+        # MiniLM embeds queries and documents identically, so one
+        # embed_documents call replaces len(missing) embed_query calls
+        with telemetry.span("embed_query", queries=len(missing)):
+            if query_batcher is not None:
+                encoded = dict(zip(missing, query_batcher.submit(missing)))
+            else:
+                encoded = dict(zip(missing, get_embedding_model().embed_documents(missing)))
+        for key, embedding in encoded.items():
+            query_embedding_cache.set((model_id, key), embedding)
+        embeddings = [
+            embedding if embedding is not None else encoded[key]
+            for key, embedding in zip(keys, embeddings)
+        ]
+    return embeddings
+
+def to_cosine(vector_store, scores):
+    """Convert raw FAISS scores to cosine similarities."""
+    if vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return scores
+    # Legacy L2 index: squared distance between unit vectors is 2 - 2cos
+    return 1 - scores / 2
+
+def cosine_to_radius(vector_store, threshold):
+    """FAISS range-search radius that keeps hits with cosine above `threshold`."""
+    if vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return threshold
+    return 2 * (1 - threshold)
+
+def search_params(index, nprobe=None, ef_search=None, selector=None):
+    """
+    Per-call FAISS search parameters for approximate indexes.
+
+    Passing these to the search call (rather than setting index.nprobe)
+    leaves the shared index untouched for concurrent requests. None keeps
+    the default saved with the index. A `selector` limits the search to
+    the vector positions it contains.
+    """
+    options = {"sel": selector} if selector is not None else {}
+    if hasattr(index, "nprobe"):
+        if nprobe is not None:
+            options["nprobe"] = nprobe
+        return faiss.SearchParametersIVF(**options) if options else None
+    if hasattr(index, "hnsw"):
+        if ef_search is not None:
+            options["efSearch"] = ef_search
+        return faiss.SearchParametersHNSW(**options) if options else None
+    return faiss.SearchParameters(**options) if options else None
+
+def normalize_sources(sources):
+    """A source filter as a hashable, order-free tuple; None (no filter) stays None."""
+    if sources is None:
+        return None
+    if isinstance(sources, str):
+        sources = [sources]
+    return tuple(sorted(set(sources)))
+
+def _filtered_positions(kind, ids, sources):
+    """Positions in `ids` of chunks from sources matching the filter, cached per filter."""
+    positions = source_filter_cache.get((kind, sources))
+    if positions is None:
+        positions = np.array(
+            [i for i, chunk_id in enumerate(ids) if matches_sources(source_of(chunk_id), sources)],
+            dtype=np.int64
+        )
+        source_filter_cache.set((kind, sources), positions)
+    return positions
+
+def _faiss_search(vector_store, vectors, k, threshold, params=None):
+    """
+    Run one FAISS call for a matrix of query vectors.
+
+    With a threshold this is a range search, so only hits above it come back
+    and are then cut to the best k; indexes without range search fall back to
+    a top-k search that is filtered afterwards. Returns, per query, a list of
+    (index position, cosine similarity) sorted best first.
+    """
+    if vector_store._normalize_L2 or vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        faiss.normalize_L2(vectors)
+
+    if threshold is not None:
+        try:
+            lims, scores, indices = vector_store.index.range_search(
+                vectors, cosine_to_radius(vector_store, threshold), params=params
+            )
+        except RuntimeError:
+            pass  # range search not supported by this index type
+        else:
+            hits = []
+            for row in range(len(vectors)):
+                start, end = int(lims[row]), int(lims[row + 1])
+                similarities = to_cosine(vector_store, scores[start:end])
+                order = np.argsort(-similarities, kind="stable")[:k]
+                hits.append([
+                    (int(indices[start + j]), float(similarities[j])) for j in order
+                ])
+            return hits
+
+    scores, indices = vector_store.index.search(vectors, k, params=params)
+    similarities = to_cosine(vector_store, scores)
+    return [
+        [
+            (int(idx), float(similarity))
+            for idx, similarity in zip(indices[row], similarities[row])
+            if idx != -1 and (threshold is None or similarity >= threshold)
+        ]
+        for row in range(len(vectors))
+    ]
+
+def _to_hits(vector_store, positions):
+    """(document, similarity) hits for (index position, similarity) pairs of one store."""
+    hits = []
+    for idx, similarity in positions:
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[idx])
+        # A string means the chunk was re-chunked away and not yet re-embedded
+        if isinstance(doc, Document):
+            hits.append((doc, similarity))
+    return hits
+
+def _search_index(vectors, k, threshold, nprobe, ef_search, sources):
+    """
+    Top-k hits per query vector, from the shards matching `sources` or from
+    the single index, restricted to their positions.
+    """
+    if is_sharded_index():
+        shards = get_index_shards()
+        telemetry.annotate(shards=len(shards.select(sources)))
+        found = shards.search(
+            vectors, k,
+            lambda store, shard_vectors: _faiss_search(
+                store, shard_vectors, k, threshold, search_params(store.index, nprobe, ef_search)
+            ),
+            sources
+        )
+        # Only the merged top k are read from the chunk store
+        return [
+            [hit for store, idx, similarity in hits for hit in _to_hits(store, [(idx, similarity)])]
+            for hits in found
+        ]
+
+    vector_store = get_vector_store()
+    selector = None
+    if sources is not None:
+        ids = vector_store.index_to_docstore_id
+        if isinstance(ids, dict):
+            ids = [ids[i] for i in range(len(ids))]
+        cached = source_filter_cache.get(("selector", sources))
+        if cached is None:
+            positions = _filtered_positions("dense", ids, sources)
+            # faiss copies the positions into the selector's own hash set
+            cached = (faiss.IDSelectorBatch(positions), len(positions))
+            source_filter_cache.set(("selector", sources), cached)
+        selector, matched = cached
+        if not matched:
+            return [[] for _ in range(len(vectors))]
+    params = search_params(vector_store.index, nprobe, ef_search, selector)
+    return [
+        _to_hits(vector_store, positions)
+        for positions in _faiss_search(vector_store, vectors, k, threshold, params)
+    ]
+
+def search_many(embeddings, k, threshold=None, nprobe=None, ef_search=None, sources=None):
+    """
+    Top-k (document, cosine similarity) hits for several query embeddings.
+
+    Results are cached per (embedding, k, threshold, search knobs, source
+    filter) and index version; all uncached embeddings go to FAISS in a
+    single multi-query call. `nprobe` (IVF) and `ef_search` (HNSW) trade
+    recall for speed. `sources` limits hits to source files matching its
+    names or glob patterns; a sharded index only searches their shards.
+    """
+    _refresh_if_index_changed()
+    sources = normalize_sources(sources)
+    keys = [
+        (array("f", embedding).tobytes(), k, threshold, nprobe, ef_search, sources)
+        for embedding in embeddings
+    ]
+    results = [search_result_cache.get(key) for key in keys]
+    missing = [i for i, hits in enumerate(results) if hits is None]
+    telemetry.count("search_cache_hits", len(keys) - len(missing))
+    telemetry.count("search_cache_misses", len(missing))
+
+    if missing:
+        vectors = np.array([embeddings[i] for i in missing], dtype=np.float32)
+        with telemetry.span("faiss_search", queries=len(missing)):
+            found = _search_index(vectors, k, threshold, nprobe, ef_search, sources)
+        for i, hits in zip(missing, found):
+            search_result_cache.set(keys[i], hits)
+            results[i] = hits
+
+    return [list(hits) for hits in results]
+
+def search(embedding, k, threshold=None, nprobe=None, ef_search=None, sources=None):
+    """Top-k (document, cosine similarity) hits for one query embedding."""
+    return search_many([embedding], k, threshold, nprobe, ef_search, sources)[0]
+
+def lexical_search(query, k, sources=None):
+    """Top-k (document, BM25 score) hits for a query, without the embedding model."""
+    _refresh_if_lexical_changed()
+    chunk_store = get_chunk_store()
+    lexical_index = get_lexical_index()
+    sources = normalize_sources(sources)
+    positions = None if sources is None else _filtered_positions("lexical", lexical_index.ids, sources)
+    with telemetry.span("lexical_search"):
+        hits = lexical_index.search(query, k, positions)
+    return [
+        (to_document(chunk_store.get(chunk_id)), score)
+        for chunk_id, score in hits
+        # The index can briefly lag behind a rewritten chunk store
+        if chunk_id in chunk_store
+    ]
+
+def reciprocal_rank_fusion(rankings, k):
+    """
+    Fuse several ranked hit lists into one top-k list of (document, RRF score).
+
+    Each document scores the sum of 1 / (RRF_K + rank) over the rankings it
+    appears in, so raw cosine and BM25 scores never need to be comparable.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            chunk_id = doc.metadata["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (RRF_K + rank)
+            documents.setdefault(chunk_id, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(documents[chunk_id], scores[chunk_id]) for chunk_id in best]
+
+def search_queries(queries, k, threshold=None, nprobe=None, ef_search=None, mode="dense", sources=None):
+    """
+    Top-k (document, score) hits for several queries in the given retrieval mode.
+
+    Dense scores are cosine similarities, lexical scores BM25 and hybrid
+    scores RRF. The threshold only applies to dense hits; the source filter
+    to all of them.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+    if mode == "lexical":
+        return [lexical_search(query, k, sources) for query in queries]
+
+    dense_k = k if mode == "dense" else max(k, HYBRID_CANDIDATES)
+    dense = search_many(embed_queries(queries), dense_k, threshold, nprobe, ef_search, sources)
+    if mode == "dense":
+        return dense
+    return [
+        reciprocal_rank_fusion([hits, lexical_search(query, dense_k, sources)], k)
+        for query, hits in zip(queries, dense)
+    ]
+
+def cache_stats():
+    """Hit/miss counters of the query caches."""
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "search_results": search_result_cache.stats(),
+    }
+
+# Per-request override of CachedRetriever.k, local to the calling thread or task
+_request_k = contextvars.ContextVar("request_k", default=None)
+
+@contextmanager
+def request_k(k):
+    """Make shared retrievers return `k` documents for calls inside this block."""
+    token = _request_k.set(k)
+    try:
+        yield
+    finally:
+        _request_k.reset(token)
+
+class CachedRetriever(BaseRetriever):
+    """
+    LangChain retriever that goes through the cached embedding and search path.
+
+    One instance can serve concurrent requests with different k via `request_k`.
+    """
+    k: int = 4
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    mode: str = "dense"
+    sources: Optional[List[str]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = _request_k.get()
+        if k is None:
+            k = self.k
+        if k <= 0:
+            return []
+        with telemetry.span("retrieve", mode=self.mode, k=k):
+            if self.mode == "dense":
+                hits = search(
+                    embed_query(query), k, nprobe=self.nprobe, ef_search=self.ef_search,
+                    sources=self.sources
+                )
+            else:
+                hits = search_queries(
+                    [query], k, nprobe=self.nprobe, ef_search=self.ef_search, mode=self.mode,
+                    sources=self.sources
+                )[0]
+            telemetry.count("chunks_retrieved", len(hits))
+        return [doc for doc, _ in hits]
+
+def get_chunk(chunk_id):
+    """
+    Fetch a single chunk from the chunk store by id.
+
     Returns:
-        list of dict: Each dict has 'content' and 'source' keys.
+        dict with 'content', 'source', 'start' and 'end' (character offsets
+        in the processed source file), or None if the id is unknown.
     """
-    # Get top_k results with similarity scores (distance)
-    results = vector_store.similarity_search_with_score(query, k=top_k)
-    
-    # Convert FAISS distances to similarity scores (FAISS distance is usually L2 or cosine distance)
-    # Here we assume cosine similarity: similarity = 1 - distance (if cosine distance used)
-    # Adjust this according to your embedding/vector type!
-    
+    chunk_store = get_chunk_store()
+    if chunk_id not in chunk_store:
+        return None
+    chunk = chunk_store.get(chunk_id)
+    return {"content": chunk.text, "source": chunk.source, "start": chunk.start, "end": chunk.end}
+
+def _to_relevant_docs(results, similarity_threshold=None):
+    """Turn (document, score) hits into result dicts, keeping those above the threshold."""
     relevant_docs = []
-    for doc, distance in results:
-        similarity = 1 - distance  # Adjust if necessary
-        if similarity >= similarity_threshold:
+    for doc, similarity in results:
+        if similarity_threshold is None or similarity >= similarity_threshold:
             relevant_docs.append({
                 "content": doc.page_content,
                 "source": doc.metadata.get("source", "Unknown"),
-                "similarity": similarity
+                "similarity": similarity,
+                "chunk_id": doc.metadata.get("chunk_id")
             })
-    
+
     if not relevant_docs:
-        return [{"content": "No relevant document found.", "source": None, "similarity": 0}]
-    
+        return [{"content": "No relevant document found.", "source": None, "similarity": 0, "chunk_id": None}]
+
     return relevant_docs
 
-if __name__ == "__main__":
-    query = input("Enter a query: ")
-    top_docs = retrieve_relevant_documents(query, top_k=3, similarity_threshold=0.7)
+def retrieve_relevant_documents(
+    query, top_k=3, similarity_threshold=0.7, nprobe=None, ef_search=None, mode="dense",
+    sources=None
+):
+    """
+    Retrieve top-k relevant documents with similarity above threshold.
     
-    for i, doc in enumerate(top_docs, start=1):
-        print(f"\nResult {i}:")
-        print(f"Source: {doc['source']}")
-        print(f"Similarity: {doc['similarity']:.3f}")
-        print(f"Content:\n{doc['content']}")
+    Args:
+        query (str): Query text.
+        top_k (int): Number of top documents to retrieve.
+        similarity_threshold (float): Cosine similarity threshold (0-1), higher
+            is better. It is applied inside the FAISS range search.
+        nprobe (int): IVF lists to visit (IVF indexes only, default from the index).
+        ef_search (int): HNSW search breadth (HNSW indexes only, default from the index).
+        mode (str): "dense" (embeddings), "lexical" (BM25, for exact section
+            numbers and codes; never loads the embedding model) or "hybrid"
+            (both rankings fused). The threshold filters dense hits only.
+        sources (list of str): Source file names or glob patterns (e.g.
+            "*power*") to search; None searches every source.
+        
+    Returns:
+        list of dict: Each dict has 'content', 'source', 'similarity' and
+        'chunk_id' keys; 'chunk_id' can be passed to `get_chunk`. 'similarity'
+        is the cosine similarity in dense mode, the BM25 score in lexical
+        mode and the fused RRF score in hybrid mode.
+    """
+    return retrieve_relevant_documents_batch(
+        [query], top_k, similarity_threshold, nprobe, ef_search, mode, sources
+    )[0]
+
+def retrieve_relevant_documents_batch(
+    queries, top_k=3, similarity_threshold=0.7, nprobe=None, ef_search=None, mode="dense",
+    sources=None
+):
+    """
+    Batch version of `retrieve_relevant_documents`.
+
+    All queries are encoded in one forward pass and searched with one
+    multi-query FAISS call (cached queries skip both).
+
+    Returns:
+        list of lists: per-query results in the same shape as
+        `retrieve_relevant_documents`, in input order.
+    """
+    if not queries:
+        return []
+    with telemetry.span("retrieve", mode=mode, k=top_k, queries=len(queries)):
+        all_results = search_queries(
+            queries, top_k, similarity_threshold, nprobe, ef_search, mode, sources
+        )
+        telemetry.count("chunks_retrieved", sum(len(results) for results in all_results))
+        # Only dense hits above the threshold come back from the index
+        threshold = similarity_threshold if mode == "dense" else None
+        return [_to_relevant_docs(results, threshold) for results in all_results]
+
+def retrieve_file(
+    queries_path, output_path, top_k=3, similarity_threshold=0.7, batch_size=64,
+    nprobe=None, ef_search=None, mode="dense", sources=None
+):
+    """Answer one query per line of `queries_path`, writing JSONL results to `output_path`."""
+    with open(queries_path, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            for query, results in zip(
+                batch,
+                retrieve_relevant_documents_batch(
+                    batch, top_k, similarity_threshold, nprobe, ef_search, mode, sources
+                )
+            ):
+                out.write(json.dumps({"query": query, "results": results}) + "\n")
+    return len(queries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieve relevant telecom documents.")
+    parser.add_argument("--queries-file", help="Text file with one query per line (batch mode).")
+    parser.add_argument("--output", default="retrieval_results.jsonl", help="JSONL output for batch mode.")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, help="IVF lists to visit per query.")
+    parser.add_argument("--ef-search", type=int, help="HNSW search breadth per query.")
+    parser.add_argument(
+        "--mode", choices=RETRIEVAL_MODES, default="dense",
+        help="dense (embeddings), lexical (BM25) or hybrid (both, fused)."
+    )
+    parser.add_argument(
+        "--sources", nargs="+",
+        help="Only search these source files (names or glob patterns, e.g. '*power*')."
+    )
+    parser.add_argument(
+        "--embedding-backend", choices=EMBEDDING_BACKENDS,
+        help="Encode queries with this backend instead of EMBEDDING_BACKEND."
+    )
+    parser.add_argument("--profile", help="Write a cProfile profile of the retrieval to this file.")
+    args = parser.parse_args()
+    if args.embedding_backend:
+        set_embedding_backend(args.embedding_backend)
+
+    profiling = telemetry.profile(args.profile) if args.profile else nullcontext()
+    if args.queries_file:
+        with profiling:
+            count = retrieve_file(
+                args.queries_file, args.output, args.top_k, args.threshold, args.batch_size,
+                args.nprobe, args.ef_search, args.mode, args.sources
+            )
+        print(f"Wrote results for {count} queries to {args.output}")
+    else:
+        query = input("Enter a query: ")
+        with profiling:
+            top_docs = retrieve_relevant_documents(
+                query, top_k=args.top_k, similarity_threshold=args.threshold,
+                nprobe=args.nprobe, ef_search=args.ef_search, mode=args.mode,
+                sources=args.sources
+            )
+
+        for i, doc in enumerate(top_docs, start=1):
+            print(f"\nResult {i}:")
+            print(f"Source: {doc['source']}")
+            print(f"Similarity: {doc['similarity']:.3f}")
+            print(f"Content:\n{doc['content']}")
@@ -0,0 +1,261 @@
+import os
+import json
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import resources
+import retrieval
+import telemetry
+from batching import MicroBatcher
+from context_builder import context_stats
+from generate_response import generate_response
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+
+# Headless HTTP API over the same retrieval and generation code as the
+# Streamlit UI, for NOC tooling and load balancers:
+#   POST /retrieve  {"query": ... | "queries": [...], "top_k", "threshold", "mode", "nprobe",
+#                    "ef_search", "sources": [file names or glob patterns]}
+#   POST /generate  {"query": ..., "doc_type", "k"}
+#   GET  /health    queue depths and prompt tokens saved by this worker
+#   GET  /metrics   telemetry in the Prometheus text format
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+# Processes accepting on the one listening socket; each loads the
+# memory-mapped index, so its pages are shared through the page cache
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+# Threads running each kind of request per worker, and how many more may
+# wait for one; requests beyond that get 503 instead of piling up
+RETRIEVE_THREADS = int(os.getenv("RETRIEVE_THREADS", "16"))
+RETRIEVE_QUEUE_SIZE = int(os.getenv("RETRIEVE_QUEUE_SIZE", "64"))
+GENERATE_THREADS = int(os.getenv("GENERATE_THREADS", "8"))
+GENERATE_QUEUE_SIZE = int(os.getenv("GENERATE_QUEUE_SIZE", "16"))
+# Largest micro-batch of query embeddings, and how long to wait for one to
+# fill (0: batch whatever queued up while the previous batch ran)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "0"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "300"))
+MAX_BODY_BYTES = 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+
+class Overloaded(Exception):
+    """Raised when a request finds its queue full."""
+
+class BoundedExecutor:
+    """
+    Thread pool that refuses work instead of queueing without limit.
+
+    At most `threads` tasks run and `queue_size` more wait; `submit` raises
+    `Overloaded` beyond that, so a burst is shed at the door rather than
+    timing out after holding memory and sockets.
+    """
+
+    def __init__(self, name, threads, queue_size):
+        self.name = name
+        self.capacity = threads + queue_size
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def submit(self, function, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            telemetry.count(f"{self.name}_rejected")
+            raise Overloaded(f"{self.name} queue is full")
+        with self._lock:
+            self.in_flight += 1
+        future = self._pool.submit(function, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "capacity": self.capacity, "rejected": self.rejected}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# Created per worker process by `start_worker`, after the fork
+executors = {}
+
+def handle_retrieve(body):
+    queries = body.get("queries")
+    single = queries is None
+    if single:
+        queries = [body.get("query")]
+    if not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+        raise ValueError("Expected a non-empty 'query' string or 'queries' list of strings.")
+    results = retrieval.retrieve_relevant_documents_batch(
+        queries,
+        top_k=int(body.get("top_k", 3)),
+        similarity_threshold=body.get("threshold", 0.7),
+        nprobe=body.get("nprobe"),
+        ef_search=body.get("ef_search"),
+        mode=body.get("mode", "dense"),
+        sources=body.get("sources")
+    )
+    return {"results": results[0] if single else results}
+
+def handle_generate(body):
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("Expected a non-empty 'query' string.")
+    response, relevant_doc, doc_type = generate_response(
+        query, body.get("doc_type", "report"), int(body.get("k", 2))
+    )
+    return {"response": response, "relevant_doc": relevant_doc, "doc_type": doc_type}
+
+ROUTES = {
+    "/retrieve": ("retrieve", handle_retrieve),
+    "/generate": ("generate", handle_generate),
+}
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients reuse one connection for many requests
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/health":
+            self._send(200, {
+                "status": "ok",
+                "pid": os.getpid(),
+                **{name: executor.stats() for name, executor in executors.items()},
+                "embed_batches": retrieval.query_batcher.stats() if retrieval.query_batcher else None,
+                "context": context_stats(),
+            })
+        elif path == "/metrics":
+            self._send(200, telemetry.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path not in ROUTES:
+            self._send(404, {"error": f"Unknown path {path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413, {"error": f"Request body over {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Expected a JSON object.")
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid request body: {e}"})
+            return
+
+        name, handler = ROUTES[path]
+        try:
+            result = executors[name].submit(handler, body).result(timeout=REQUEST_TIMEOUT)
+        except Overloaded as e:
+            self._send(503, {"error": str(e)}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        except TimeoutError:
+            self._send(504, {"error": f"No result within {REQUEST_TIMEOUT:.0f}s"})
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logging.exception(f"Error handling {path}")
+            self._send(500, {"error": str(e)})
+        else:
+            self._send(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    # Connections waiting to be accepted; the executors bound the work itself
+    request_queue_size = 128
+
+def start_worker(warm_up=True):
+    """Create this process's executors and query batcher, and load the resources."""
+    executors["retrieve"] = BoundedExecutor("retrieve", RETRIEVE_THREADS, RETRIEVE_QUEUE_SIZE)
+    executors["generate"] = BoundedExecutor("generate", GENERATE_THREADS, GENERATE_QUEUE_SIZE)
+    retrieval.query_batcher = MicroBatcher(
+        retrieval.embed_query_batch, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS / 1000
+    )
+    if warm_up:
+        # Retrieval needs no API key; generation reports the missing key per request
+        resources.warm_up(llm=bool(os.getenv("MISTRAL_API_KEY")))
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+def _serve(server):
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for executor in executors.values():
+            executor.shutdown()
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    """
+    Serve the API on `host`:`port` with `workers` processes.
+
+    The socket is bound once and workers are forked before anything is
+    loaded, so no threads or model state cross the fork; the kernel spreads
+    connections over the processes accepting on it. Metrics and /health
+    describe the worker that answered.
+    """
+    server = ServiceHTTPServer((host, port), ServiceHandler)
+    if workers > 1 and not hasattr(os, "fork"):
+        logging.warning("Multiple workers need os.fork; serving with one.")
+        workers = 1
+
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            start_worker()
+            _serve(server)
+            os._exit(0)
+        children.append(pid)
+
+    # Stopping the parent stops every worker
+    signal.signal(signal.SIGTERM, _stop)
+    logging.info(f"Serving on http://{host}:{port} with {workers} worker(s)")
+    try:
+        start_worker()
+        _serve(server)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve retrieval and generation over HTTP.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker processes.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import uuid
+import cProfile
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-stage tracing for requests and ingestion runs. Off by default: spans
+# and counters are then a flag check returning a shared no-op object.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "0") == "1"
+# Port of the Prometheus text endpoint (/metrics); 0 serves nothing
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_PREFIX = "telecom_assistant"
+# Upper bounds (seconds) of the span duration histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# One JSON line per finished trace; INFO even when the root logger is quieter
+logger = logging.getLogger("telemetry")
+logger.setLevel(logging.INFO)
+
+_enabled = TELEMETRY_ENABLED
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Totals across traces, for the metrics endpoint
+_metrics_lock = threading.Lock()
+_span_metrics = {}
+_counters = {}
+
+def enable(enabled=True):
+    """Turn tracing on or off for this process."""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def _record_metrics(spans, counters):
+    with _metrics_lock:
+        for span in spans:
+            seconds = span["duration_ms"] / 1000
+            metric = _span_metrics.setdefault(
+                span["name"], {"count": 0, "sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            )
+            metric["count"] += 1
+            metric["sum"] += seconds
+            # Per-bucket counts (the last is +Inf); cumulated when rendered
+            metric["buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        for name, value in counters.items():
+            _counters[name] = _counters.get(name, 0) + value
+
+class _NoopSpan:
+    """Stands in for spans and traces while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def span(self, name, **attrs):
+        return self
+
+    def activate(self):
+        return self
+
+    def count(self, name, value=1):
+        pass
+
+    def annotate(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.record = self.trace._open(self.name, self.attrs)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.trace._close(self.record)
+        return False
+
+class Trace:
+    """
+    Spans and counters of one request or ingestion run.
+
+    Spans nest under the innermost open span of the trace. `activate` makes
+    the trace current for `span` and `count` calls in library code; keep
+    `yield` out of an activated block, because the context it sets cannot be
+    reset from another task. `finish` logs the trace as one JSON line and
+    adds it to the process metrics.
+    """
+
+    def __init__(self, name, attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.counters = {}
+        self._stack = []
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def _open(self, name, attrs):
+        record = {
+            "name": name,
+            "parent": self._stack[-1]["name"] if self._stack else self.name,
+            "start_ms": (time.perf_counter() - self._start) * 1000,
+            **attrs,
+        }
+        self._stack.append(record)
+        return record
+
+    def _close(self, record):
+        record["duration_ms"] = (time.perf_counter() - self._start) * 1000 - record["start_ms"]
+        if record in self._stack:
+            self._stack.remove(record)
+        self.spans.append(record)
+
+    def span(self, name, **attrs):
+        return _Span(self, name, attrs)
+
+    @contextmanager
+    def activate(self):
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def annotate(self, **attrs):
+        """Add attributes to the innermost open span, or to the trace."""
+        (self._stack[-1] if self._stack else self.attrs).update(attrs)
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        for span in spans:
+            span["start_ms"] = round(span["start_ms"], 3)
+            span["duration_ms"] = round(span["duration_ms"], 3)
+        _record_metrics(
+            [{"name": self.name, "duration_ms": duration_ms}] + spans, self.counters
+        )
+        logger.info(json.dumps({
+            "trace": self.name,
+            "trace_id": self.id,
+            "duration_ms": round(duration_ms, 3),
+            **self.attrs,
+            "spans": spans,
+            "counters": self.counters,
+        }))
+
+def start_trace(name, **attrs):
+    """A new trace (a no-op one while tracing is off); call `finish` when done."""
+    if not _enabled:
+        return _NOOP
+    return Trace(name, attrs)
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def _root_span(name, attrs):
+    trace = Trace(name, attrs)
+    try:
+        with trace.activate():
+            yield trace
+    finally:
+        trace.finish()
+
+def span(name, **attrs):
+    """
+    Time a stage as a span of the current trace.
+
+    Outside a trace the span starts (and on exit logs) a new trace, so the
+    same call works for a whole request and for a stage within one.
+    """
+    if not _enabled:
+        return _NOOP
+    trace = _current_trace.get()
+    if trace is None:
+        return _root_span(name, attrs)
+    return trace.span(name, **attrs)
+
+def traced(name):
+    """Decorator form of `span` for functions."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1):
+    """Add to a counter of the current trace (and of the process metrics)."""
+    if not _enabled:
+        return
+    trace = _current_trace.get()
+    if trace is None:
+        _record_metrics([], {name: value})
+    else:
+        trace.count(name, value)
+
+def annotate(**attrs):
+    """Add attributes to the current span."""
+    if not _enabled:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotate(**attrs)
+
+def metrics_snapshot():
+    """Span histograms and counters collected so far, as a dict."""
+    with _metrics_lock:
+        return {
+            "spans": {
+                name: {**metric, "buckets": list(metric["buckets"])}
+                for name, metric in _span_metrics.items()
+            },
+            "counters": dict(_counters),
+        }
+
+def reset_metrics():
+    with _metrics_lock:
+        _span_metrics.clear()
+        _counters.clear()
+
+def render_prometheus():
+    """The process metrics in the Prometheus text exposition format."""
+    snapshot = metrics_snapshot()
+    name = f"{METRICS_PREFIX}_span_seconds"
+    lines = [f"# HELP {name} Duration of traced stages.", f"# TYPE {name} histogram"]
+    for span_name, metric in sorted(snapshot["spans"].items()):
+        label = f'span="{span_name}"'
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, metric["buckets"]):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {metric["count"]}')
+        lines.append(f"{name}_sum{{{label}}} {metric['sum']:.6f}")
+        lines.append(f"{name}_count{{{label}}} {metric['count']}")
+    name = f"{METRICS_PREFIX}_events_total"
+    lines += [f"# HELP {name} Counted events (chunks, tokens, cache hits).", f"# TYPE {name} counter"]
+    for counter, value in sorted(snapshot["counters"].items()):
+        lines.append(f'{name}{{name="{counter}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    Serve /metrics from a background thread, once per process.
+
+    Does nothing when `port` is 0. Returns the server, or None.
+    """
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return _metrics_server
+
+@contextmanager
+def profile(path):
+    """
+    Profile the enclosed code with cProfile and write the stats to `path`.
+
+    Meant for a single request: view with `python -m pstats path` or
+    snakeviz. Sampling profilers need no hook, e.g.
+    `py-spy record -o profile.svg -- python generate_response.py`.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logging.info(f"Profile written to {path}")
@@ -1,13 +1,23 @@
 
 import streamlit as st
-from generate_response import generate_response
-import time
+from generate_response import stream_response
+from resources import warm_up
+from telemetry import start_metrics_server
 import os
 import webbrowser
 
 # Set page config
 st.set_page_config(page_title="Telecom AI Assistant", layout="wide")
 
+@st.cache_resource(show_spinner="Loading models and index...")
+def load_resources():
+    """Load the embedder, index and LLM once per server process."""
+    # Prometheus /metrics on METRICS_PORT, if set
+    start_metrics_server()
+    return warm_up()
+
+load_resources()
+
 # Initialize session state
 if "response" not in st.session_state:
     st.session_state.response = ""
@@ -75,6 +85,14 @@ with col_left:
         )
 
 with col_right:
+    def stream_to_session(query, doc_type):
+        """Yield response tokens for st.write_stream, recording the source document."""
+        for kind, value in stream_response(query, doc_type):
+            if kind == "source":
+                st.session_state.relevant_doc = value
+            else:
+                yield value
+
     def clear_output():
         st.session_state.response = ""
         st.session_state.relevant_doc = ""
@@ -98,14 +116,13 @@ with col_right:
                 st.button("Clear", on_click=clear_output)
 
             if st.session_state.processing:
-                with st.spinner("Generating response..."):
-                    time.sleep(1.5)
-                    response, relevant_doc, _ = generate_response(query)
-                    st.session_state.response = response
-                    st.session_state.relevant_doc = relevant_doc
-                    st.session_state.doc_type = None
-                    st.session_state.processing = False
-                    st.rerun()
+                # Tokens are shown as they arrive; the full output section
+                # replaces them on the rerun
+                st.markdown("**AI Response:**")
+                st.session_state.response = st.write_stream(stream_to_session(query, "report"))
+                st.session_state.doc_type = None
+                st.session_state.processing = False
+                st.rerun()
 
     elif mode == "Generate Document":
         st.markdown("#### 📝 Generate Document", unsafe_allow_html=True)
@@ -130,14 +147,11 @@ with col_right:
                 st.button("Clear", on_click=clear_output)
 
             if st.session_state.processing:
-                with st.spinner("Generating document..."):
-                    time.sleep(1.5)
-                    response, relevant_doc, selected_doc_type = generate_response(query, doc_type.lower())
-                    st.session_state.response = response
-                    st.session_state.relevant_doc = relevant_doc
-                    st.session_state.doc_type = selected_doc_type
-                    st.session_state.processing = False
-                    st.rerun()
+                st.markdown(f"**Generated {doc_type}:**")
+                st.session_state.response = st.write_stream(stream_to_session(query, doc_type.lower()))
+                st.session_state.doc_type = doc_type.lower()
+                st.session_state.processing = False
+                st.rerun()
 
     # Output section
     if st.session_state.response and not st.session_state.processing: